@@ -1,9 +1,16 @@
 # src/data/data_generator.py
+import argparse
 import json
 import time
 import random
 import datetime
-from azure.eventhub import EventHubProducerClient, EventData
+
+# azure-eventhub is only needed for sending; the generator logic is also used
+# by the dashboard's live stream view, which runs without the Azure SDK
+try:
+    from azure.eventhub import EventHubProducerClient, EventData
+except ImportError:
+    EventHubProducerClient = EventData = None
 
 # --- Azure Event Hubs Configuration ---
 EVENTHUB_FULLY_QUALIFIED_NAMESPACE = "YOUR_EVENTHUB_NAMESPACE_NAME.servicebus.windows.net" # e.g., "mlopsanomaly-eh-namespace.servicebus.windows.net"
@@ -14,12 +21,20 @@ EVENTHUB_SEND_POLICY_PRIMARY_KEY = "YOUR_EVENTHUB_SEND_PRIMARY_KEY" # Get this f
 # Format: Endpoint=sb://<NAMESPACE NAME>.servicebus.windows.net/;SharedAccessKeyName=<POLICY_NAME>;SharedAccessKey=<KEY>
 CONNECTION_STR = f"Endpoint=sb://{EVENTHUB_FULLY_QUALIFIED_NAMESPACE}/;SharedAccessKeyName=SendPolicy;SharedAccessKey={EVENTHUB_SEND_POLICY_PRIMARY_KEY}"
 
-producer = EventHubProducerClient.from_connection_string(
-    conn_str=CONNECTION_STR,
-    eventhub_name=EVENTHUB_NAME
-)
+producer = None # Created on first send
 # --- End Azure Event Hubs Configuration ---
 
+def get_producer():
+    global producer
+    if producer is None:
+        if EventHubProducerClient is None:
+            raise ImportError("azure-eventhub is required to send to Event Hubs: pip install azure-eventhub")
+        producer = EventHubProducerClient.from_connection_string(
+            conn_str=CONNECTION_STR,
+            eventhub_name=EVENTHUB_NAME
+        )
+    return producer
+
 def generate_transaction_data():
     transaction_id = str(random.randint(100000, 999999))
     user_id = str(random.randint(1000, 5000))
@@ -44,10 +59,10 @@ def generate_transaction_data():
     }
 
 async def send_to_eventhub(record):
-    event_data_batch = await producer.create_batch()
+    event_data_batch = await get_producer().create_batch()
     event_data_batch.add(EventData(json.dumps(record)))
     try:
-        await producer.send_batch(event_data_batch)
+        await get_producer().send_batch(event_data_batch)
         print(f"Sent record: {record['transaction_id']} to Event Hub.")
     except Exception as e:
         print(f"Error sending record to Event Hub: {e}")
@@ -60,6 +75,24 @@ async def main():
         await send_to_eventhub(data)
         await asyncio.sleep(random.uniform(0.1, 0.5)) # Send data every 0.1 to 0.5 seconds
 
+async def write_to_file(output_file, rate):
+    # Local stand-in for Event Hubs: append one JSON transaction per line.
+    # The dashboard's Live Stream view can tail this file.
+    with open(output_file, "a") as f:
+        while True:
+            f.write(json.dumps(generate_transaction_data()) + "\n")
+            f.flush()
+            await asyncio.sleep(1.0 / rate)
+
 if __name__ == "__main__":
-    print(f"Starting data generation to Azure Event Hub: {EVENTHUB_NAME}")
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate synthetic transactions")
+    parser.add_argument("--output-file", help="Write JSON lines to this file instead of sending to Event Hubs")
+    parser.add_argument("--rate", type=float, default=10.0, help="Events per second when writing to a file")
+    args = parser.parse_args()
+
+    if args.output_file:
+        print(f"Starting data generation to file: {args.output_file}")
+        asyncio.run(write_to_file(args.output_file, args.rate))
+    else:
+        print(f"Starting data generation to Azure Event Hub: {EVENTHUB_NAME}")
+        asyncio.run(main())
\ No newline at end of file
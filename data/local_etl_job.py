@@ -0,0 +1,435 @@
+# src/data/local_etl_job.py
+# Spark-free version of databricks_etl_job.py for small volumes, dev environments and tests.
+#
+# Reads Event Hubs Capture Avro files, parses the JSON transaction in each record's Body,
+# and writes the same columns as the Databricks job as Parquet partitioned by
+# transaction_hour (<output>/transaction_hour=<h>/part-*.parquet, appended to like the
+# Spark job's mode("append")). Avro files are decoded one record at a time, timestamps
+# are parsed per batch of records, and files are processed in parallel worker processes.
+#
+# Usage:
+#   python local_etl_job.py --input /mnt/raw_transactions_data --output /mnt/processed_transactions_data
+#   python local_etl_job.py --benchmark   # Generates Capture files locally and reports rows/s
+import argparse
+import glob
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Event Hubs Capture only uses the snappy codec when configured to; deflate and null need no extra package
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+# --- Local ETL Configuration ---
+BATCH_ROWS = 50_000 # Records per timestamp-parsing and Parquet write batch; bounds worker memory
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f" # Same as the Spark job's yyyy-MM-dd'T'HH:mm:ss.SSSSSS
+PARTITION_COLUMN = "transaction_hour" # Must match partitionBy in databricks_etl_job.py
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__" # Spark's directory name for a null partition value
+# --- End Local ETL Configuration ---
+
+# Schema of the JSON message in each Body, as in databricks_etl_job.py's transaction_schema
+TRANSACTION_SCHEMA = [
+    ("transaction_id", "string"),
+    ("user_id", "string"),
+    ("amount", "double"),
+    ("timestamp", "string"),
+    ("is_fraud", "boolean"),
+    ("ip_address", "string"),
+    ("device_type", "string"),
+    ("merchant_id", "string"),
+]
+
+# Columns written to each Parquet file. As with Spark, the partition column is only in the directory name.
+OUTPUT_SCHEMA = pa.schema([
+    ("transaction_id", pa.string()),
+    ("user_id", pa.string()),
+    ("amount", pa.float64()),
+    ("timestamp", pa.string()),
+    ("timestamp_utc", pa.timestamp("us", tz="UTC")),
+    ("is_fraud", pa.bool_()),
+    ("ip_address", pa.string()),
+    ("device_type", pa.string()),
+    ("merchant_id", pa.string()),
+])
+
+# --- Avro container decoding ---
+
+def _read_long(buf, pos):
+    # Zig-zag encoded variable-length integer
+    b = buf[pos]
+    pos += 1
+    n = b & 0x7F
+    shift = 7
+    while b & 0x80:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        shift += 7
+    return (n >> 1) ^ -(n & 1), pos
+
+def _read_bytes(buf, pos):
+    size, pos = _read_long(buf, pos)
+    return buf[pos:pos + size], pos + size
+
+def _read_string(buf, pos):
+    size, pos = _read_long(buf, pos)
+    return buf[pos:pos + size].decode("utf-8"), pos + size
+
+def _read_float(buf, pos):
+    return struct.unpack_from("<f", buf, pos)[0], pos + 4
+
+def _read_double(buf, pos):
+    return struct.unpack_from("<d", buf, pos)[0], pos + 8
+
+def _read_boolean(buf, pos):
+    return buf[pos] == 1, pos + 1
+
+def _read_null(buf, pos):
+    return None, pos
+
+_PRIMITIVE_READERS = {
+    "null": _read_null, "boolean": _read_boolean, "int": _read_long, "long": _read_long,
+    "float": _read_float, "double": _read_double, "bytes": _read_bytes, "string": _read_string,
+}
+
+def _blocks(buf, pos, read_item):
+    # Arrays and maps are written as blocks of items ending with an empty block
+    items = []
+    count, pos = _read_long(buf, pos)
+    while count:
+        if count < 0: # A negative count is followed by the block's size in bytes
+            count = -count
+            _, pos = _read_long(buf, pos)
+        for _ in range(count):
+            item, pos = read_item(buf, pos)
+            items.append(item)
+        count, pos = _read_long(buf, pos)
+    return items, pos
+
+def _compile_reader(schema, named):
+    """Turns an Avro schema into a function (buf, pos) -> (value, new pos)."""
+    if isinstance(schema, list): # Union: the branch index comes first
+        branches = [_compile_reader(branch, named) for branch in schema]
+        def read_union(buf, pos):
+            index, pos = _read_long(buf, pos)
+            return branches[index](buf, pos)
+        return read_union
+    if isinstance(schema, str):
+        if schema in _PRIMITIVE_READERS:
+            return _PRIMITIVE_READERS[schema]
+        return lambda buf, pos: named[schema](buf, pos) # Reference to a named type, possibly recursive
+    kind = schema["type"]
+    if kind in _PRIMITIVE_READERS: # e.g. {"type": "string"} or a logical type on a primitive
+        return _PRIMITIVE_READERS[kind]
+    if kind == "record":
+        fields = [(field["name"], _compile_reader(field["type"], named)) for field in schema["fields"]]
+        def read_record(buf, pos):
+            record = {}
+            for name, read_field in fields:
+                record[name], pos = read_field(buf, pos)
+            return record, pos
+        named[schema["name"]] = read_record
+        return read_record
+    if kind == "map":
+        read_value = _compile_reader(schema["values"], named)
+        def read_entry(buf, pos):
+            key, pos = _read_string(buf, pos)
+            value, pos = read_value(buf, pos)
+            return (key, value), pos
+        def read_map(buf, pos):
+            entries, pos = _blocks(buf, pos, read_entry)
+            return dict(entries), pos
+        return read_map
+    if kind == "array":
+        read_item = _compile_reader(schema["items"], named)
+        return lambda buf, pos: _blocks(buf, pos, read_item)
+    if kind == "enum":
+        symbols = schema["symbols"]
+        def read_enum(buf, pos):
+            index, pos = _read_long(buf, pos)
+            return symbols[index], pos
+        named[schema["name"]] = read_enum
+        return read_enum
+    if kind == "fixed":
+        size = schema["size"]
+        read_fixed = lambda buf, pos: (buf[pos:pos + size], pos + size)
+        named[schema["name"]] = read_fixed
+        return read_fixed
+    raise ValueError(f"Unsupported Avro type: {kind}")
+
+def _read_file_long(f):
+    # _read_long for the few integers read straight from the file (header and block sizes)
+    raw = bytearray()
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise EOFError("Unexpected end of Avro file")
+        raw += byte
+        if not byte[0] & 0x80:
+            return _read_long(bytes(raw), 0)[0]
+
+def _decompress(data, codec):
+    if codec == "null":
+        return data
+    if codec == "deflate":
+        return zlib.decompress(data, -15) # Raw deflate stream, no zlib header
+    if codec == "snappy":
+        if snappy is None:
+            raise ImportError("python-snappy is required to read snappy-compressed Avro files: pip install python-snappy")
+        return snappy.decompress(data[:-4]) # Followed by a 4-byte CRC32 of the uncompressed data
+    raise ValueError(f"Unsupported Avro codec: {codec}")
+
+def iter_avro_records(path):
+    """Yields the records of an Avro container file one at a time, holding one block in memory."""
+    with open(path, "rb") as f:
+        if f.read(4) != b"Obj\x01":
+            raise ValueError(f"{path} is not an Avro container file")
+        metadata = {}
+        count = _read_file_long(f)
+        while count:
+            if count < 0:
+                count = -count
+                _read_file_long(f)
+            for _ in range(count):
+                key = f.read(_read_file_long(f)).decode("utf-8")
+                metadata[key] = f.read(_read_file_long(f))
+            count = _read_file_long(f)
+        sync_marker = f.read(16)
+
+        read_record = _compile_reader(json.loads(metadata["avro.schema"]), {})
+        codec = metadata.get("avro.codec", b"null").decode("utf-8")
+
+        while f.peek(1): # Empty at end of file
+            n_records = _read_file_long(f)
+            block = _decompress(f.read(_read_file_long(f)), codec)
+            pos = 0
+            for _ in range(n_records):
+                record, pos = read_record(block, pos)
+                yield record
+            if f.read(16) != sync_marker:
+                raise ValueError(f"{path} is corrupt: sync marker mismatch")
+
+# --- Transformation ---
+
+# from_json semantics: a value of the wrong JSON type becomes null
+def _to_string(value):
+    if value is None or type(value) is str:
+        return value
+    return json.dumps(value) # Spark keeps the raw JSON text of non-string values
+
+def _to_double(value):
+    return float(value) if type(value) in (int, float) else None # bool is not a number here
+
+def _to_boolean(value):
+    return value if type(value) is bool else None
+
+_FIELD_CONVERTERS = [(name, {"string": _to_string, "double": _to_double, "boolean": _to_boolean}[kind])
+                     for name, kind in TRANSACTION_SCHEMA]
+_decode_json = json.JSONDecoder().decode
+
+def parse_body(body):
+    """Parses one record's Body into a tuple in TRANSACTION_SCHEMA order, or None if it is not a JSON object."""
+    try:
+        message = _decode_json(body.decode("utf-8")) if body is not None else None
+    except ValueError: # Includes invalid UTF-8
+        message = None
+    if type(message) is not dict:
+        return None
+    get = message.get
+    return tuple([convert(get(name)) for name, convert in _FIELD_CONVERTERS])
+
+def transform_batch(rows):
+    """Turns a list of parse_body tuples into an Arrow table with timestamp_utc and transaction_hour."""
+    empty = (None,) * len(TRANSACTION_SCHEMA)
+    columns = list(zip(*(row or empty for row in rows)))
+    data = {name: values for (name, _), values in zip(TRANSACTION_SCHEMA, columns)}
+
+    # Parsed for the whole batch at once; values not matching the format become null, like to_timestamp
+    timestamp_utc = pd.to_datetime(pd.Series(data["timestamp"], dtype=object), format=TIMESTAMP_FORMAT,
+                                   errors="coerce", utc=True)
+    arrays = [pa.array(data[field.name], type=field.type) for field in OUTPUT_SCHEMA if field.name != "timestamp_utc"]
+    arrays.insert(OUTPUT_SCHEMA.get_field_index("timestamp_utc"),
+                  pa.array(timestamp_utc, type=OUTPUT_SCHEMA.field("timestamp_utc").type))
+    table = pa.Table.from_arrays(arrays, schema=OUTPUT_SCHEMA)
+    hours = pc.hour(table["timestamp_utc"])
+    return table, hours
+
+# --- Job ---
+
+def list_capture_files(input_root):
+    # Capture writes <namespace>/<eventhub>/<partition>/<yyyy>/<MM>/<dd>/<HH>/<mm>/<ss>.avro
+    return sorted(glob.glob(os.path.join(input_root, "**", "*.avro"), recursive=True))
+
+def process_file(source_path, file_index, staging_root, job_id, batch_rows=BATCH_ROWS):
+    """
+    Runs in a worker process. Converts one Capture file into one Parquet file per
+    transaction_hour under staging_root. Returns (records, unparseable bodies).
+    """
+    writers = {}
+    n_records = 0
+    n_unparseable = 0
+
+    def write_batch(rows):
+        table, hours = transform_batch(rows)
+        for hour in pc.unique(hours).to_pylist():
+            mask = pc.is_null(hours) if hour is None else pc.fill_null(pc.equal(hours, hour), False)
+            partition = f"{PARTITION_COLUMN}={NULL_PARTITION if hour is None else hour}"
+            if partition not in writers:
+                os.makedirs(os.path.join(staging_root, partition), exist_ok=True)
+                writers[partition] = pq.ParquetWriter(
+                    os.path.join(staging_root, partition, f"part-{file_index:05d}-{job_id}.c000.snappy.parquet"),
+                    OUTPUT_SCHEMA, compression="snappy")
+            writers[partition].write_table(table.filter(mask))
+
+    try:
+        rows = []
+        for record in iter_avro_records(source_path):
+            row = parse_body(record.get("Body"))
+            n_unparseable += row is None
+            rows.append(row)
+            if len(rows) >= batch_rows:
+                write_batch(rows)
+                n_records += len(rows)
+                rows = []
+        if rows:
+            write_batch(rows)
+            n_records += len(rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return n_records, n_unparseable
+
+def run_etl(input_root, output_root, n_jobs=-1, batch_rows=BATCH_ROWS):
+    """
+    Processes every Capture file under input_root. Output is staged under
+    <output_root>/_temporary and only moved into the partition directories once all files
+    have succeeded, so a failed run leaves the processed data unchanged.
+    """
+    files = list_capture_files(input_root)
+    job_id = str(uuid.uuid4())
+    staging_root = os.path.join(output_root, "_temporary", job_id)
+    os.makedirs(staging_root, exist_ok=True)
+    print(f"Processing {len(files)} Capture files from {input_root}")
+
+    start = time.perf_counter()
+    total_records = 0
+    total_unparseable = 0
+    max_workers = os.cpu_count() if n_jobs == -1 else n_jobs
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(process_file, path, index, staging_root, job_id, batch_rows)
+                       for index, path in enumerate(files)]
+            for future in as_completed(futures):
+                n_records, n_unparseable = future.result()
+                total_records += n_records
+                total_unparseable += n_unparseable
+
+        # Commit: move the staged files into place, then mark the output as complete like Spark
+        for staged_path in glob.glob(os.path.join(staging_root, f"{PARTITION_COLUMN}=*", "*.parquet")):
+            partition_dir = os.path.join(output_root, os.path.basename(os.path.dirname(staged_path)))
+            os.makedirs(partition_dir, exist_ok=True)
+            os.replace(staged_path, os.path.join(partition_dir, os.path.basename(staged_path)))
+        open(os.path.join(output_root, "_SUCCESS"), "w").close()
+    finally:
+        # Only this job's staging directory: other jobs may be writing to the same output root
+        shutil.rmtree(staging_root, ignore_errors=True)
+        try:
+            os.rmdir(os.path.join(output_root, "_temporary")) # Removed once no job is using it
+        except OSError:
+            pass
+
+    elapsed = time.perf_counter() - start
+    if total_unparseable:
+        print(f"Warning: {total_unparseable} records had a Body that is not a JSON object; written with null fields")
+    print(f"Processed {total_records} records in {elapsed:.1f}s ({total_records / max(elapsed, 1e-9):.0f} records/s)")
+    return total_records
+
+# --- Benchmark data ---
+
+def _long_bytes(n):
+    n = (n << 1) ^ (n >> 63) # Zig-zag
+    out = bytearray()
+    while n & ~0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+def _bytes_field(data):
+    return _long_bytes(len(data)) + data
+
+# The schema Event Hubs Capture writes
+CAPTURE_SCHEMA = {
+    "type": "record", "name": "EventData", "namespace": "Microsoft.ServiceBus.Messaging",
+    "fields": [
+        {"name": "SequenceNumber", "type": "long"},
+        {"name": "Offset", "type": "string"},
+        {"name": "EnqueuedTimeUtc", "type": "string"},
+        {"name": "SystemProperties", "type": {"type": "map", "values": ["long", "double", "string", "bytes"]}},
+        {"name": "Properties", "type": {"type": "map", "values": ["long", "double", "string", "bytes", "null"]}},
+        {"name": "Body", "type": ["null", "bytes"]},
+    ],
+}
+
+def write_capture_file(path, bodies, block_records=1000):
+    """Writes JSON-serializable bodies as a deflate-compressed Capture Avro file, for benchmarks and tests."""
+    sync_marker = os.urandom(16)
+    metadata = {"avro.schema": json.dumps(CAPTURE_SCHEMA).encode("utf-8"), "avro.codec": b"deflate"}
+    with open(path, "wb") as f:
+        f.write(b"Obj\x01" + _long_bytes(len(metadata)))
+        for key, value in metadata.items():
+            f.write(_bytes_field(key.encode("utf-8")) + _bytes_field(value))
+        f.write(_long_bytes(0) + sync_marker)
+        for block_start in range(0, len(bodies), block_records):
+            block = bytearray()
+            for sequence_number, body in enumerate(bodies[block_start:block_start + block_records], start=block_start):
+                block += _long_bytes(sequence_number)
+                block += _bytes_field(str(sequence_number * 512).encode("utf-8"))
+                block += _bytes_field(time.strftime("%m/%d/%Y %I:%M:%S %p").encode("utf-8"))
+                block += _long_bytes(0) + _long_bytes(0) # Empty SystemProperties and Properties
+                block += _long_bytes(1) + _bytes_field(json.dumps(body).encode("utf-8"))
+            compressor = zlib.compressobj(wbits=-15)
+            data = compressor.compress(bytes(block)) + compressor.flush()
+            n_records = min(block_records, len(bodies) - block_start)
+            f.write(_long_bytes(n_records) + _long_bytes(len(data)) + data + sync_marker)
+
+def benchmark(n_files=8, records_per_file=25_000, n_jobs=-1):
+    """Generates Capture files with data_generator.py's transactions and times run_etl on them."""
+    from data_generator import generate_transaction_data
+
+    with tempfile.TemporaryDirectory() as root:
+        input_root = os.path.join(root, "raw")
+        for i in range(n_files):
+            partition_dir = os.path.join(input_root, "namespace", "eventhub", str(i))
+            os.makedirs(partition_dir)
+            write_capture_file(os.path.join(partition_dir, "00.avro"),
+                               [generate_transaction_data() for _ in range(records_per_file)])
+        run_etl(input_root, os.path.join(root, "processed"), n_jobs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert Event Hubs Capture Avro files into processed Parquet without Spark")
+    parser.add_argument("--input", help="Raw Capture root, e.g. the raw data container mount")
+    parser.add_argument("--output", help="Processed data root; partitions are appended to")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Worker processes (-1 = all cores)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--benchmark", action="store_true", help="Time the job on generated Capture files")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(n_jobs=args.n_jobs)
+    elif args.input and args.output:
+        run_etl(args.input, args.output, args.n_jobs, args.batch_rows)
+    else:
+        parser.error("--input and --output are required unless --benchmark is given")
@@ -323,6 +323,45 @@ resource "azurerm_monitor_scheduled_query_rules_alert" "function_app_errors_aler
   }
 }
 
+# --- Azure Monitor Log Alert: Feature / Score Drift ---
+# Alerts when the Function's drift monitor raises a retrain signal (PSI/KS above threshold vs. the training baseline)
+resource "azurerm_monitor_scheduled_query_rules_alert" "drift_retrain_alert" {
+  name                = "${var.project_name_prefix}-drift-retrain"
+  location            = azurerm_resource_group.rg.location
+  resource_group_name = azurerm_resource_group.rg.name
+  severity            = 3
+  frequency           = "PT15M"
+  time_window         = "PT15M"
+  enabled             = true
+  data_source_id      = azurerm_log_analytics_workspace.logs.id
+
+  criteria {
+    type = "LogQuery"
+    metric_trigger {
+      metric_column = "Count"
+      metric_trigger_type = "NumberOfViolations"
+      operator = "GreaterThan"
+      threshold = 0 # Any retrain signal
+    }
+    query = <<QUERY
+    AppTraces
+    | where AppRoleName == "${azurerm_linux_function_app.anomaly_detector_function_app.name}"
+    | where Message has "DRIFT DETECTED"
+    | summarize Count=count() by bin(TimeGenerated, 15m)
+    | project Count
+    QUERY
+  }
+  action {
+    action_group = [azurerm_monitor_action_group.mlops_alerts.id]
+  }
+
+  tags = {
+    Environment = "Dev"
+    Project     = var.project_name_prefix
+    ManagedBy   = "Terraform"
+  }
+}
+
 # Data source to associate Application Insights with Log Analytics Workspace
 resource "azurerm_application_insights_workbook" "ml_app_insights_workbook_association" {
   name                = "${azurerm_application_insights.ml_app_insights.name}-workbook" # Example name
@@ -1,10 +1,17 @@
 # src/inference/AnomalyDetectorFunction/AnomalyHubTrigger/__init__.py
+import asyncio
+import functools
 import logging
 import azure.functions as func
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import pandas as pd # For pd.to_datetime
+from .drift_monitor import load_drift_monitor
+from .fallback_model import load_fallback_model
+from .resilience import CircuitBreaker, LatencyTracker, hedged_call
 
 # --- Azure ML Endpoint Configuration ---
 # These will be set as Application Settings in the Function App via Terraform
@@ -19,12 +26,114 @@ headers = {
 
 # --- End Azure ML Endpoint Configuration ---
 
+# --- Latency SLO Configuration ---
+BATCH_LATENCY_BUDGET_SECONDS = float(os.environ.get("BATCH_LATENCY_BUDGET_SECONDS", "5")) # Per invocation; later events are scored locally
+ENDPOINT_MAX_ROWS = int(os.environ.get("ENDPOINT_MAX_ROWS", "256")) # Transactions per endpoint request
+HEDGE_PERCENTILE = 95 # A backup request is sent once a call takes longer than this latency percentile
+HEDGE_MIN_DELAY_SECONDS = 0.05 # Floor on the hedge delay, so a fast endpoint is not sent duplicate requests
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5")) # Consecutive failed or slow calls before opening
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30")) # How long to skip the endpoint once open
+SLOW_CALL_SECONDS = float(os.environ.get("SLOW_CALL_SECONDS", "2")) # Successful calls slower than this count as failures
+# Lightweight model exported by train.py (fallback_model.npz); deploy it next to this file
+FALLBACK_MODEL_PATH = os.environ.get("FALLBACK_MODEL_PATH", os.path.join(os.path.dirname(__file__), "fallback_model.npz"))
+
+latency_tracker = LatencyTracker()
+circuit_breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS, SLOW_CALL_SECONDS)
+endpoint_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="aml-endpoint") # Primary and hedged calls
+fallback_model = load_fallback_model(FALLBACK_MODEL_PATH)
+if fallback_model is None:
+    logging.info(f"No fallback model at {FALLBACK_MODEL_PATH}; events the endpoint cannot score in time are left unscored.")
+# --- End Latency SLO Configuration ---
+
+# --- Drift Monitoring Configuration ---
+# The baseline is written by train.py (drift_baseline.json); deploy it next to this file
+DRIFT_BASELINE_PATH = os.environ.get("DRIFT_BASELINE_PATH", os.path.join(os.path.dirname(__file__), "drift_baseline.json"))
+DRIFT_WINDOW_SECONDS = int(os.environ.get("DRIFT_WINDOW_SECONDS", "3600")) # Sliding window compared with the baseline
+DRIFT_WINDOW_BUCKETS = 12 # Window granularity: old counts expire one bucket at a time
+DRIFT_CHECK_INTERVAL_SECONDS = int(os.environ.get("DRIFT_CHECK_INTERVAL_SECONDS", "300"))
+DRIFT_MIN_WINDOW_EVENTS = int(os.environ.get("DRIFT_MIN_WINDOW_EVENTS", "500"))
+DRIFT_PSI_THRESHOLD = float(os.environ.get("DRIFT_PSI_THRESHOLD", "0.2"))
+DRIFT_KS_THRESHOLD = float(os.environ.get("DRIFT_KS_THRESHOLD", "0.15"))
+DRIFT_RETRAIN_COOLDOWN_SECONDS = int(os.environ.get("DRIFT_RETRAIN_COOLDOWN_SECONDS", "21600")) # At most one signal per 6 hours
+DRIFT_RETRAIN_WEBHOOK_URL = os.environ.get("DRIFT_RETRAIN_WEBHOOK_URL") # Optional, e.g. a Logic App that submits train.py
+
+# Lives for as long as the Function host process, so the window spans invocations
+drift_monitor = load_drift_monitor(
+    DRIFT_BASELINE_PATH,
+    window_seconds=DRIFT_WINDOW_SECONDS,
+    n_buckets=DRIFT_WINDOW_BUCKETS,
+    check_interval_seconds=DRIFT_CHECK_INTERVAL_SECONDS,
+    min_events=DRIFT_MIN_WINDOW_EVENTS,
+    psi_threshold=DRIFT_PSI_THRESHOLD,
+    ks_threshold=DRIFT_KS_THRESHOLD,
+    retrain_cooldown_seconds=DRIFT_RETRAIN_COOLDOWN_SECONDS
+)
+if drift_monitor is None:
+    logging.info(f"No drift baseline at {DRIFT_BASELINE_PATH}; drift monitoring is disabled.")
+# --- End Drift Monitoring Configuration ---
+
 # Suppress verbose http logging from azure.core.pipeline
 logging.getLogger('azure.core.pipeline.policies.http_logging_policy').setLevel(logging.WARNING)
 
+def check_drift(amounts, hours, scores):
+    """Adds a batch to the drift windows and raises a retrain signal if the scheduled check finds drift."""
+    drift_monitor.observe("amount", amounts)
+    drift_monitor.observe("transaction_hour", hours)
+    drift_monitor.observe("anomaly_score", scores)
+
+    report = drift_monitor.check()
+    if report is None:
+        return
+    logging.info(f"Drift check: {json.dumps(report)}")
+    if report["retrain"]:
+        # Picked up by the drift log alert in Azure Monitor
+        logging.warning(f"!!! DRIFT DETECTED !!! Retrain recommended. Drifted: {report['drifted']}, Metrics: {report['metrics']}")
+        if DRIFT_RETRAIN_WEBHOOK_URL:
+            try:
+                requests.post(DRIFT_RETRAIN_WEBHOOK_URL, json=report, timeout=10).raise_for_status()
+            except Exception as e:
+                logging.error(f"Failed to send retrain signal: {e}")
+
+def post_to_endpoint(rows, timeout):
+    """Blocking call to the Azure ML endpoint for a list of feature rows; runs in endpoint_executor."""
+    start = time.monotonic()
+    response = requests.post(AML_ENDPOINT_URL, json=rows, headers=headers, timeout=max(timeout, 0.01))
+    response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+    predictions = response.json()
+    if not isinstance(predictions, list) or len(predictions) != len(rows):
+        raise ValueError(f"Unexpected endpoint response: {predictions}")
+    latency_tracker.record(time.monotonic() - start)
+    return predictions
+
+async def score_with_endpoint(rows, deadline):
+    """Scores rows with the endpoint within the deadline. Returns None if it cannot."""
+    if not circuit_breaker.allow_request():
+        return None
+    start = time.monotonic()
+    hedge_delay = max(HEDGE_MIN_DELAY_SECONDS, latency_tracker.percentile(HEDGE_PERCENTILE))
+    try:
+        predictions, hedged = await hedged_call(functools.partial(post_to_endpoint, rows), deadline, hedge_delay, endpoint_executor)
+    except Exception as e:
+        circuit_breaker.record_failure()
+        logging.warning(f"Endpoint did not score {len(rows)} transactions in time: {e}")
+        return None
+    circuit_breaker.record_success(time.monotonic() - start)
+    if hedged:
+        logging.info(f"Hedged endpoint request answered after {time.monotonic() - start:.3f}s (hedge delay {hedge_delay:.3f}s)")
+    return predictions
+
+def score_with_fallback(rows):
+    """Scores rows with the embedded lightweight model; results are marked for later rescoring."""
+    scores = fallback_model.score(rows)
+    return [dict(row, anomaly_score=float(score), is_anomaly_predicted=bool(score < 0),
+                 scored_by="fallback", fallback_scored=True) for row, score in zip(rows, scores)]
+
 async def main(events: str, context: func.Context):
     logging.info(f'Python EventHub trigger function processed {len(events)} events.')
+    # Every event in this batch is scored, by the endpoint or locally, before the budget runs out
+    deadline = time.monotonic() + BATCH_LATENCY_BUDGET_SECONDS
 
+    transactions, inference_rows = [], []
     for event in events:
         try:
             event_body = event.get_body().decode('utf-8')
@@ -35,30 +144,68 @@ async def main(events: str, context: func.Context):
             # triggers from an Event Hub, it typically provides the *unwrapped* event body.
             # So, we expect a raw JSON string of a single transaction.
             transaction_data = json.loads(event_body)
+            if transaction_data.get("amount") is None:
+                raise ValueError("Transaction has no amount")
 
             # --- Feature Extraction for Inference (must match score.py expectations) ---
             # The 'score.py' expects a list of dictionaries like [{"amount": ..., "transaction_hour": ...}]
-            # so we create that payload here.
-            inference_payload = [{
+            # so we create one row per transaction and send the batch together.
+            inference_rows.append({
                 "amount": transaction_data.get("amount"),
-                "transaction_hour": pd.to_datetime(transaction_data.get("timestamp")).hour
-            }]
+                "transaction_hour": pd.to_datetime(transaction_data.get("timestamp")).hour,
+                # Segment keys let score.py route to a per-segment model (falls back to the global model)
+                "merchant_id": transaction_data.get("merchant_id"),
+                "device_type": transaction_data.get("device_type")
+            })
+            transactions.append(transaction_data)
+
+        except Exception as e:
+            logging.error(f"Error processing event: {e}. Event Body: {event.get_body().decode('utf-8')}")
 
-            # Make request to Azure ML Endpoint
-            response = requests.post(AML_ENDPOINT_URL, json=inference_payload, headers=headers)
-            response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+    # Make requests to Azure ML Endpoint, one per chunk, concurrently
+    chunk_starts = range(0, len(inference_rows), ENDPOINT_MAX_ROWS)
+    chunk_predictions = await asyncio.gather(*(
+        score_with_endpoint(inference_rows[start:start + ENDPOINT_MAX_ROWS], deadline) for start in chunk_starts
+    ))
+    predictions = [None] * len(inference_rows)
+    for start, chunk in zip(chunk_starts, chunk_predictions):
+        if chunk is not None:
+            predictions[start:start + len(chunk)] = chunk
 
-            predictions = response.json()
-            logging.info(f"Transaction ID: {transaction_data.get('transaction_id')}, Prediction Response: {predictions}")
+    # Past the deadline (or with the circuit open), score the rest locally
+    unscored = [i for i, prediction in enumerate(predictions) if prediction is None]
+    if unscored and fallback_model is not None:
+        for i, prediction in zip(unscored, score_with_fallback([inference_rows[i] for i in unscored])):
+            predictions[i] = prediction
+        logging.warning(f"FALLBACK SCORED {len(unscored)} of {len(predictions)} transactions (circuit: {circuit_breaker.state}); "
+                        f"rescore later. IDs: {[transactions[i].get('transaction_id') for i in unscored]}")
 
-            # --- Process Prediction Results ---
-            if predictions and predictions[0].get('is_anomaly_predicted'):
-                # Log anomalies to Function App logs (which go to Application Insights)
-                logging.warning(f"!!! ANOMALY DETECTED !!! ID: {transaction_data.get('transaction_id')}, Amount: {transaction_data.get('amount')}, Score: {predictions[0].get('anomaly_score')}")
-                # Future: Send this anomaly record to a dedicated 'alerts' Event Hub or Azure Cosmos DB
-                # for further processing or dashboarding.
-            else:
-                logging.info(f"Transaction ID: {transaction_data.get('transaction_id')} - Normal.")
+    # Per-batch feature and score values for drift monitoring (binned, never stored raw)
+    batch_amounts = [row["amount"] for row in inference_rows]
+    batch_hours = [row["transaction_hour"] for row in inference_rows]
+    batch_scores = []
 
+    # --- Process Prediction Results ---
+    for transaction_data, prediction in zip(transactions, predictions):
+        if prediction is None:
+            logging.error(f"Transaction ID: {transaction_data.get('transaction_id')} could not be scored in time.")
+            continue
+        logging.info(f"Transaction ID: {transaction_data.get('transaction_id')}, Prediction Response: {prediction}")
+        if prediction.get('scored_by') == 'global':
+            # The score baseline comes from the global model; segment and fallback models score on their own scales
+            batch_scores.append(prediction.get('anomaly_score'))
+
+        if prediction.get('is_anomaly_predicted'):
+            # Log anomalies to Function App logs (which go to Application Insights)
+            logging.warning(f"!!! ANOMALY DETECTED !!! ID: {transaction_data.get('transaction_id')}, Amount: {transaction_data.get('amount')}, "
+                            f"Score: {prediction.get('anomaly_score')}, Scored by: {prediction.get('scored_by')}")
+            # Future: Send this anomaly record to a dedicated 'alerts' Event Hub or Azure Cosmos DB
+            # for further processing or dashboarding.
+        else:
+            logging.info(f"Transaction ID: {transaction_data.get('transaction_id')} - Normal.")
+
+    if drift_monitor is not None:
+        try:
+            check_drift(batch_amounts, batch_hours, batch_scores)
         except Exception as e:
-            logging.error(f"Error processing event: {e}. Event Body: {event.get_body().decode('utf-8')}")
\ No newline at end of file
+            logging.error(f"Drift monitoring failed: {e}")
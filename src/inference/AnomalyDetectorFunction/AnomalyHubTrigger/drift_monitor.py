@@ -0,0 +1,120 @@
+# src/inference/AnomalyDetectorFunction/AnomalyHubTrigger/drift_monitor.py
+# Compares live feature and score distributions with the training baseline written by
+# src/models/drift.py. Only binned counts are kept (no raw events), in a sliding window
+# of time buckets, so memory is fixed at n_buckets x n_bins per monitored quantity.
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+
+def _bin_counts(values, edges):
+    # Same binning as drift.histogram: out-of-range values go to the first or last bin
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    bins = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+    return np.bincount(bins, minlength=len(edges) - 1)
+
+def population_stability_index(expected, actual, epsilon=1e-4):
+    """PSI between two binned distributions. Rule of thumb: < 0.1 stable, 0.1-0.2 moderate, > 0.2 significant."""
+    expected = np.maximum(np.asarray(expected, dtype=float), epsilon)
+    actual = np.maximum(np.asarray(actual, dtype=float) / max(np.sum(actual), 1), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def ks_statistic(expected, actual):
+    """Kolmogorov-Smirnov statistic on binned data: the largest gap between the two CDFs."""
+    actual = np.asarray(actual, dtype=float) / max(np.sum(actual), 1)
+    return float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual))))
+
+class SlidingWindowHistogram:
+    """Fixed-bin counts over the last window_seconds, kept as n_buckets rolling time buckets."""
+
+    def __init__(self, edges, window_seconds=3600, n_buckets=12):
+        self.edges = np.asarray(edges, dtype=float)
+        self.n_buckets = n_buckets
+        self.bucket_seconds = window_seconds / n_buckets
+        self._buckets = deque() # (bucket index, counts), oldest first
+
+    def _expire(self, current_bucket):
+        while self._buckets and self._buckets[0][0] <= current_bucket - self.n_buckets:
+            self._buckets.popleft()
+
+    def add(self, values, now=None):
+        bucket = int((time.time() if now is None else now) // self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != bucket:
+            self._buckets.append((bucket, np.zeros(len(self.edges) - 1, dtype=np.int64)))
+        self._buckets[-1][1][:] += _bin_counts(values, self.edges)
+        self._expire(bucket)
+
+    def counts(self, now=None):
+        self._expire(int((time.time() if now is None else now) // self.bucket_seconds))
+        total = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        for _, bucket_counts in self._buckets:
+            total += bucket_counts
+        return total
+
+class DriftMonitor:
+    """
+    Tracks amount, transaction_hour and anomaly_score over a sliding window and, at most once
+    per check interval, compares each with its training baseline using PSI and KS.
+    """
+
+    def __init__(self, baseline, window_seconds=3600, n_buckets=12, check_interval_seconds=300,
+                 min_events=500, psi_threshold=0.2, ks_threshold=0.15, retrain_cooldown_seconds=21600):
+        self.baseline = baseline
+        self.check_interval_seconds = check_interval_seconds
+        self.min_events = min_events
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.retrain_cooldown_seconds = retrain_cooldown_seconds
+        self.windows = {
+            name: SlidingWindowHistogram(histogram["edges"], window_seconds, n_buckets)
+            for name, histogram in baseline["histograms"].items()
+        }
+        self._last_check = time.time()
+        self._last_retrain_signal = None
+
+    def observe(self, name, values, now=None):
+        if name in self.windows and len(values):
+            self.windows[name].add(values, now)
+
+    def check(self, now=None):
+        """
+        Returns a drift report once the check interval has elapsed, otherwise None.
+
+        The report has per-quantity metrics, the names that crossed a threshold, and
+        `retrain`, which is True when drift was found and no retrain signal was raised
+        within the cooldown.
+        """
+        now = time.time() if now is None else now
+        if now - self._last_check < self.check_interval_seconds:
+            return None
+        self._last_check = now
+
+        metrics, drifted = {}, []
+        for name, window in self.windows.items():
+            counts = window.counts(now)
+            if counts.sum() < self.min_events:
+                continue # Too few events in the window for a stable comparison
+            expected = self.baseline["histograms"][name]["proportions"]
+            metrics[name] = {
+                "psi": round(population_stability_index(expected, counts), 4),
+                "ks": round(ks_statistic(expected, counts), 4),
+                "n_events": int(counts.sum())
+            }
+            if metrics[name]["psi"] > self.psi_threshold or metrics[name]["ks"] > self.ks_threshold:
+                drifted.append(name)
+
+        retrain = bool(drifted) and (self._last_retrain_signal is None or
+                                     now - self._last_retrain_signal >= self.retrain_cooldown_seconds)
+        if retrain:
+            self._last_retrain_signal = now
+        return {"metrics": metrics, "drifted": drifted, "retrain": retrain,
+                "baseline_model_version": self.baseline.get("model_version")}
+
+def load_drift_monitor(path, **settings):
+    """Creates a DriftMonitor from a baseline file, or returns None if the file is not deployed."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return DriftMonitor(json.load(f), **settings)
@@ -0,0 +1,43 @@
+# src/inference/AnomalyDetectorFunction/AnomalyHubTrigger/fallback_model.py
+# Local scoring with the lightweight IsolationForest exported by train.py (fallback_model.npz).
+# Used only when the Azure ML endpoint cannot answer within the batch's latency budget.
+# Needs numpy only: the trees are plain arrays, traversed for all trees and rows at once.
+import os
+import numpy as np
+
+class CompactIsolationForest:
+    """Scores with the same convention as the endpoint: lower is more anomalous, < 0 is an anomaly."""
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.path_length = arrays["path_length"]
+        self.normalizer = float(arrays["normalizer"])
+        self.offset = float(arrays["offset"])
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+
+    def score(self, rows):
+        """Scores a list of feature dicts. Returns one anomaly score per row."""
+        X = np.array([[row[name] for name in self.feature_names] for row in rows], dtype=np.float32)
+        n_trees = self.feature.shape[0]
+        tree_index = np.arange(n_trees)[:, None]
+        row_index = np.arange(len(X))[None, :]
+        node = np.zeros((n_trees, len(X)), dtype=np.int64)
+        while True:
+            left = self.children_left[tree_index, node]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[row_index, self.feature[tree_index, node]] <= self.threshold[tree_index, node]
+            node = np.where(internal, np.where(go_left, left, self.children_right[tree_index, node]), node)
+        total_path_length = self.path_length[tree_index, node].sum(axis=0)
+        return -(2.0 ** (-total_path_length / self.normalizer)) - self.offset
+
+def load_fallback_model(path):
+    """Loads the exported fallback model, or returns None if it is not deployed."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        return CompactIsolationForest({name: arrays[name] for name in arrays.files})
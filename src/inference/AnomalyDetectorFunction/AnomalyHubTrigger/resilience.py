@@ -0,0 +1,115 @@
+# src/inference/AnomalyDetectorFunction/AnomalyHubTrigger/resilience.py
+# Keeps Azure ML endpoint calls within a batch's latency budget: hedged requests timed from
+# recent latencies, and a circuit breaker that stops calling an endpoint that keeps failing.
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+import numpy as np
+
+class LatencyTracker:
+    """Recent successful endpoint latencies, used to decide when to send a hedged request."""
+
+    def __init__(self, window=200, min_samples=20, default_seconds=0.5):
+        self.min_samples = min_samples
+        self.default_seconds = default_seconds # Used until enough calls have been seen
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, q):
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_seconds
+            return float(np.percentile(self._latencies, q))
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed or slow calls. While open, callers skip
+    the endpoint entirely. After open_seconds one trial call is let through (half-open), and
+    its outcome closes the circuit or opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, open_seconds=30.0, slow_call_seconds=2.0):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self, seconds):
+        if seconds > self.slow_call_seconds:
+            # Slow answers count against the endpoint even though they succeeded
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("Circuit breaker closed: endpoint calls succeeded again.")
+            self.state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"Circuit breaker opened after {self._consecutive_failures} failed or slow "
+                                    f"endpoint calls; scoring locally for {self.open_seconds}s.")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+async def hedged_call(call, deadline, hedge_delay, executor=None):
+    """
+    Runs the blocking call(timeout) in a worker thread, where timeout is the time left until
+    deadline (a time.monotonic() value). If it has not succeeded after hedge_delay seconds,
+    or fails before then, one identical backup call is started and whichever succeeds first
+    is used. Returns (result, hedged). Raises the last error, or TimeoutError once the deadline passes.
+    """
+    loop = asyncio.get_running_loop()
+    attempts = {loop.run_in_executor(executor, call, deadline - time.monotonic())}
+    hedged = False
+    last_error = None
+    try:
+        while attempts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, attempts = await asyncio.wait(attempts, timeout=remaining if hedged else min(hedge_delay, remaining),
+                                                return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                try:
+                    return attempt.result(), hedged
+                except Exception as e:
+                    last_error = e
+            if not hedged and deadline - time.monotonic() > 0:
+                attempts.add(loop.run_in_executor(executor, call, deadline - time.monotonic()))
+                hedged = True
+        raise last_error or TimeoutError("Endpoint did not answer within the batch latency budget")
+    finally:
+        # Attempts still running end on their own request timeout, which is bounded by the deadline.
+        # Their outcome is no longer needed; retrieving it keeps asyncio from logging it as unhandled.
+        for attempt in attempts:
+            attempt.add_done_callback(lambda f: f.cancelled() or f.exception())
@@ -0,0 +1,183 @@
+# src/models/backfill.py
+# Batch rescoring of historical transactions.
+#
+# Streams the processed Parquet partitions written by databricks_etl_job.py
+# (<input>/transaction_hour=<h>/part-*.parquet) and scores them in large vectorized
+# chunks across a process pool. Scores are written with the model version as Parquet
+# partitioned the same way. Progress is recorded per partition, so an interrupted run
+# resumes where it stopped.
+#
+# Usage:
+#   python backfill.py --input /mnt/processed_transactions_data --output /mnt/backfill_scores/v7 \
+#                      --model-path azureml-models/anomaly-detection-model/7/anomaly_isolation_forest_model.joblib
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from detectors import FEATURE_NAMES, load_detector
+
+# --- Backfill Configuration ---
+PARTITION_COLUMN = "transaction_hour" # Must match partitionBy in databricks_etl_job.py
+CHUNK_ROWS = 500_000 # Rows scored per model call; bounds worker memory
+PROGRESS_FILENAME = "_backfill_progress.json" # Written to the output root
+# --- End Backfill Configuration ---
+
+# Loaded once per worker process by _init_worker
+_worker_model = None
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = load_detector(model_path)
+
+def list_partition_files(input_root):
+    """Returns {partition directory name: [parquet files]} for the processed data layout."""
+    partitions = {}
+    for path in sorted(glob.glob(os.path.join(input_root, f"{PARTITION_COLUMN}=*", "*.parquet"))):
+        partitions.setdefault(os.path.basename(os.path.dirname(path)), []).append(path)
+    return partitions
+
+def _partition_value(partition):
+    # Spark writes null partition values as __HIVE_DEFAULT_PARTITION__
+    value = partition.split("=", 1)[1]
+    return int(value) if value.isdigit() else None
+
+# Columns added to every source row, after the source file's own columns
+SCORE_FIELDS = [
+    pa.field("anomaly_score", pa.float64()), # null if the row has a missing feature
+    pa.field("is_anomaly_predicted", pa.bool_()),
+    pa.field("model_version", pa.string()),
+    pa.field("scored_at", pa.string()),
+]
+
+def _feature_matrix(batch, hour):
+    # The partition column lives in the directory name, not in the file
+    columns = []
+    for name in FEATURE_NAMES:
+        if name == PARTITION_COLUMN:
+            columns.append(np.full(batch.num_rows, np.nan if hour is None else hour, dtype=np.float64))
+        else:
+            columns.append(batch.column(name).to_numpy(zero_copy_only=False).astype(np.float64))
+    return np.column_stack(columns)
+
+def score_file(source_path, partition, output_path, model_version, chunk_rows=CHUNK_ROWS):
+    """
+    Runs in a worker process. Scores one source file chunk by chunk and writes the result
+    to output_path. The file is written under a temporary name and renamed when complete,
+    so a half-written output is never mistaken for a finished one. Returns the row count.
+    """
+    hour = _partition_value(partition)
+    scored_at = datetime.now(timezone.utc).isoformat()
+    tmp_path = output_path + ".tmp"
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    source = pq.ParquetFile(source_path)
+    # Fixed up front from the file's schema, so chunks whose values infer differently
+    # (e.g. an all-null column) are still written with the same types
+    schema = pa.schema(list(source.schema_arrow) + SCORE_FIELDS)
+    if source.metadata.num_rows == 0:
+        return 0
+
+    n_rows = 0
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for batch in source.iter_batches(batch_size=chunk_rows):
+            X = _feature_matrix(batch, hour)
+            valid = ~np.isnan(X).any(axis=1)
+            scores = np.zeros(batch.num_rows)
+            if valid.any():
+                scores[valid] = _worker_model.score_batch(pd.DataFrame(X[valid], columns=FEATURE_NAMES))
+
+            # Score columns are appended to the Arrow batch; the source columns are not converted
+            score_columns = [
+                pa.array(scores, mask=~valid),
+                pa.array(scores < 0, mask=~valid),
+                pa.array(np.full(batch.num_rows, model_version, dtype=object), type=pa.string()),
+                pa.array(np.full(batch.num_rows, scored_at, dtype=object), type=pa.string()),
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(batch.columns + score_columns, schema=schema))
+            n_rows += batch.num_rows
+
+    os.replace(tmp_path, output_path)
+    return n_rows
+
+def load_progress(progress_path, model_version):
+    if not os.path.exists(progress_path):
+        return {"model_version": model_version, "partitions": {}}
+    with open(progress_path) as f:
+        progress = json.load(f)
+    if progress["model_version"] != model_version:
+        raise ValueError(f"{progress_path} tracks a backfill for model version {progress['model_version']}, "
+                         f"not {model_version}. Use a separate output directory per model version.")
+    return progress
+
+def save_progress(progress, progress_path):
+    # Write-then-rename keeps the progress file valid if the job is killed mid-write
+    with open(progress_path + ".tmp", "w") as f:
+        json.dump(progress, f, indent=2)
+    os.replace(progress_path + ".tmp", progress_path)
+
+def run_backfill(input_root, output_root, model_path, model_version, n_jobs=-1, chunk_rows=CHUNK_ROWS):
+    """Scores every processed partition not yet recorded as done in the output's progress file."""
+    os.makedirs(output_root, exist_ok=True)
+    progress_path = os.path.join(output_root, PROGRESS_FILENAME)
+    progress = load_progress(progress_path, model_version)
+    partitions = list_partition_files(input_root)
+
+    tasks = []
+    for partition, files in partitions.items():
+        state = progress["partitions"].setdefault(partition, {"status": "pending", "done_files": [], "rows": 0})
+        for source_path in files:
+            name = os.path.basename(source_path)
+            if name not in state["done_files"]:
+                tasks.append((source_path, partition, os.path.join(output_root, partition, name)))
+        state["total_files"] = len(files)
+        state["status"] = "done" if len(state["done_files"]) == len(files) else state["status"]
+    save_progress(progress, progress_path)
+
+    n_done = sum(len(files) for files in partitions.values()) - len(tasks)
+    print(f"Backfilling {len(tasks)} files across {len(partitions)} partitions with model version {model_version} "
+          f"({n_done} files already done)")
+
+    start = time.perf_counter()
+    total_rows = 0
+    max_workers = os.cpu_count() if n_jobs == -1 else n_jobs
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = {pool.submit(score_file, source_path, partition, output_path, model_version, chunk_rows): (source_path, partition)
+                   for source_path, partition, output_path in tasks}
+        # Progress is only updated by the parent, as each file completes
+        for future in as_completed(futures):
+            source_path, partition = futures[future]
+            n_rows = future.result()
+            state = progress["partitions"][partition]
+            state["done_files"].append(os.path.basename(source_path))
+            state["rows"] += n_rows
+            state["status"] = "done" if len(state["done_files"]) == state["total_files"] else "in_progress"
+            save_progress(progress, progress_path)
+            total_rows += n_rows
+            if state["status"] == "done":
+                print(f"  {partition}: done ({state['rows']} rows)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/s)")
+    return progress
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore processed transaction partitions with a registered model")
+    parser.add_argument("--input", required=True, help="Processed data root written by databricks_etl_job.py")
+    parser.add_argument("--output", required=True, help="Output root for scored partitions (one per model version)")
+    parser.add_argument("--model-path", required=True, help="Model artifact file, e.g. a downloaded registered model")
+    parser.add_argument("--model-version", help="Version recorded with every score (default: the artifact's parent directory name)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Worker processes (-1 = all cores)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    # Registered models download as <model_name>/<version>/<artifact>
+    model_version = args.model_version or os.path.basename(os.path.dirname(os.path.abspath(args.model_path)))
+    run_backfill(args.input, args.output, args.model_path, model_version, args.n_jobs, args.chunk_rows)
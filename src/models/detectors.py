@@ -0,0 +1,408 @@
+# src/models/detectors.py
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+# Features every detector is trained and scored on (must match score.py and the Azure Function payload)
+FEATURE_NAMES = ['amount', 'transaction_hour']
+
+# Fixed work-space ranges for the streaming detector, in transformed units (amount is log1p-scaled).
+# Fixed ranges keep a cold start from being skewed by whatever the first micro-batch contains.
+DEFAULT_FEATURE_RANGES = {'amount': (0.0, float(np.log1p(100_000))), 'transaction_hour': (0.0, 23.0)}
+
+def _as_matrix(X, feature_names=FEATURE_NAMES):
+    """Returns the feature columns of a DataFrame (or an array already in feature order) as floats."""
+    if isinstance(X, pd.DataFrame):
+        X = X[feature_names]
+    return np.asarray(X, dtype=float)
+
+def _average_path_length(n_samples):
+    """c(n) from the Isolation Forest paper: the average path length of an unsuccessful BST search over n points."""
+    n_samples = np.asarray(n_samples, dtype=float)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    large = n_samples > 2
+    result[large] = 2.0 * (np.log(n_samples[large] - 1.0) + np.euler_gamma) - 2.0 * (n_samples[large] - 1.0) / n_samples[large]
+    return result
+
+def format_explanations(explanations, feature_names=FEATURE_NAMES):
+    """Turns the arrays returned by score_and_explain into one JSON-serializable dict per row."""
+    records = []
+    for contributions, isolating_share, path_length in zip(explanations["feature_contributions"],
+                                                           explanations["isolating_share"],
+                                                           explanations["mean_path_length"]):
+        records.append({
+            "top_feature": feature_names[int(np.argmax(contributions))],
+            "feature_contributions": {f: round(float(v), 4) for f, v in zip(feature_names, contributions)},
+            "isolating_share": {f: round(float(v), 4) for f, v in zip(feature_names, isolating_share)},
+            "mean_path_length": round(float(path_length), 3)
+        })
+    return records
+
+class AnomalyDetector:
+    """
+    Interface shared by every anomaly detector in the project.
+
+    Scores follow the IsolationForest convention used throughout the pipeline:
+    lower means more anomalous, and a score below 0 is flagged as an anomaly.
+    """
+
+    detector_type = None
+    supports_partial_update = False
+    supports_explanations = False
+
+    def fit(self, X):
+        """Trains the detector on a batch of transactions. Returns self."""
+        raise NotImplementedError
+
+    def partial_update(self, X):
+        """Updates the detector with newly observed transactions, without a batch retrain. Returns self."""
+        raise NotImplementedError(f"{type(self).__name__} does not support online updates; use fit()")
+
+    def score_batch(self, X):
+        """Returns one anomaly score per row (lower = more anomalous, < 0 = anomaly)."""
+        raise NotImplementedError
+
+    @property
+    def ready(self):
+        """True once the detector can score. Batch-trained detectors are ready as soon as they are fitted."""
+        return True
+
+    @property
+    def min_training_rows(self):
+        """Rows fit() needs before the detector is ready."""
+        return 1
+
+    def predict_batch(self, X):
+        """Returns a boolean anomaly flag per row."""
+        return self.score_batch(X) < 0
+
+    def score_and_explain(self, X):
+        """
+        Returns (scores, explanations): the same scores as score_batch, plus per-row arrays
+        (see format_explanations) saying which features drove each score.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support explanations")
+
+    def get_state(self):
+        raise NotImplementedError
+
+    def set_state(self, state):
+        raise NotImplementedError
+
+    def serialize(self, path):
+        """Writes the detector to path. The file holds plain data, so it does not depend on this module's import path."""
+        joblib.dump({"detector_type": self.detector_type, "state": self.get_state()}, path)
+
+class IsolationForestDetector(AnomalyDetector):
+    """Batch-trained sklearn IsolationForest behind the detector interface."""
+
+    detector_type = "isolation_forest"
+
+    def __init__(self, contamination=0.01, n_estimators=100, max_samples="auto", max_features=1.0, random_state=42):
+        self.model = IsolationForest(
+            contamination=contamination,
+            n_estimators=n_estimators,
+            max_samples=max_samples,
+            max_features=max_features,
+            random_state=random_state
+        )
+
+    @classmethod
+    def from_estimator(cls, model):
+        detector = cls.__new__(cls)
+        detector.model = model
+        return detector
+
+    def fit(self, X):
+        self.model.fit(_as_matrix(X))
+        return self
+
+    def score_batch(self, X):
+        if isinstance(X, pd.DataFrame) and hasattr(self.model, "feature_names_in_"):
+            # Older artifacts were fitted on DataFrames; keep their column names to avoid sklearn warnings
+            return self.model.decision_function(X[list(self.model.feature_names_in_)])
+        return self.model.decision_function(_as_matrix(X))
+
+    def _path_tables(self):
+        """
+        One table per tree with a row per node, describing the root-to-node path:
+        [path length, share of splits on each feature / path length, one-hot of the feature
+        that made the last split]. Path length is depth plus c(n) for the samples left at the
+        node. A point's whole path is then known from its leaf alone. Built once per model.
+        """
+        if getattr(self, "_path_tables_cache", None) is None:
+            n_features = self.model.n_features_in_
+            tables = []
+            for tree, tree_features in zip(self.model.estimators_, self.model.estimators_features_):
+                t = tree.tree_
+                depth = np.zeros(t.node_count)
+                split_counts = np.zeros((t.node_count, n_features))
+                last_split = np.zeros((t.node_count, n_features))
+                for node in range(t.node_count): # Parents always precede their children
+                    if t.children_left[node] == -1:
+                        continue
+                    feature = tree_features[t.feature[node]]
+                    for child in (t.children_left[node], t.children_right[node]):
+                        depth[child] = depth[node] + 1
+                        split_counts[child] = split_counts[node]
+                        split_counts[child, feature] += 1
+                        last_split[child, feature] = 1
+                path_length = depth + _average_path_length(t.n_node_samples)
+                contributions = split_counts / np.maximum(path_length, 1.0)[:, None]
+                tables.append(np.column_stack([path_length, contributions, last_split]))
+            self._path_tables_cache = tables
+        return self._path_tables_cache
+
+    def score_and_explain(self, X):
+        """
+        Scores and explains in one pass over the trees: each point is routed to its leaf once,
+        and both its path length (the score) and its per-feature split counts (the explanation)
+        are read from that leaf.
+
+        feature_contributions: share of the path splits made on each feature, averaged over
+        trees with weight 1 / path length, so trees that isolated the point early count most.
+        isolating_share: share of trees in which each feature made the split that isolated the point.
+        """
+        if isinstance(X, pd.DataFrame):
+            X = X[list(getattr(self.model, "feature_names_in_", FEATURE_NAMES))]
+        X = np.asarray(X, dtype=np.float32) # Trees split on float32, as in IsolationForest.score_samples
+        n_features = X.shape[1]
+        totals = np.zeros((len(X), 1 + 2 * n_features))
+
+        for tree, tree_features, table in zip(self.model.estimators_, self.model.estimators_features_, self._path_tables()):
+            subset = X[:, tree_features] if len(tree_features) < n_features else X
+            totals += np.take(table, tree.apply(subset, check_input=False), axis=0) # Faster than fancy indexing
+
+        n_trees = len(self.model.estimators_)
+        total_path_length = totals[:, 0]
+        contributions = totals[:, 1:1 + n_features]
+        normalizer = n_trees * _average_path_length([self.model.max_samples_])[0]
+        scores = -(2.0 ** (-total_path_length / normalizer)) - self.model.offset_
+        explanations = {
+            "feature_contributions": contributions / np.maximum(contributions.sum(axis=1, keepdims=True), 1e-12),
+            "isolating_share": totals[:, 1 + n_features:] / n_trees,
+            "mean_path_length": total_path_length / n_trees
+        }
+        return scores, explanations
+
+    def export_compact(self, path):
+        """
+        Writes the forest as plain numpy arrays (.npz) that can be scored without sklearn or this
+        module (see the Azure Function's fallback_model.py). Trees are padded to the same node count.
+        """
+        trees = [estimator.tree_ for estimator in self.model.estimators_]
+        n_trees, max_nodes = len(trees), max(t.node_count for t in trees)
+        feature = np.zeros((n_trees, max_nodes), dtype=np.int16)
+        threshold = np.zeros((n_trees, max_nodes))
+        children_left = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+        children_right = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+        path_length = np.zeros((n_trees, max_nodes))
+        for i, (t, tree_features, table) in enumerate(zip(trees, self.model.estimators_features_, self._path_tables())):
+            n_nodes = t.node_count
+            feature[i, :n_nodes] = tree_features[np.maximum(t.feature, 0)] # Leaves have no feature (-2)
+            threshold[i, :n_nodes] = t.threshold
+            children_left[i, :n_nodes] = t.children_left
+            children_right[i, :n_nodes] = t.children_right
+            path_length[i, :n_nodes] = table[:, 0]
+        np.savez_compressed(
+            path, feature=feature, threshold=threshold, children_left=children_left,
+            children_right=children_right, path_length=path_length,
+            normalizer=n_trees * _average_path_length([self.model.max_samples_])[0],
+            offset=self.model.offset_,
+            feature_names=np.array(list(getattr(self.model, "feature_names_in_", FEATURE_NAMES)))
+        )
+
+    @property
+    def supports_explanations(self):
+        return hasattr(self.model, "estimators_")
+
+    def get_state(self):
+        return {"model": self.model}
+
+    def set_state(self, state):
+        self.model = state["model"]
+
+class HalfSpaceTreesDetector(AnomalyDetector):
+    """
+    Streaming Half-Space Trees detector (Tan, Ting & Liu, 2011).
+
+    Each tree is a complete binary tree of random axis-aligned splits over a perturbed unit
+    work space. Nodes count how many recent transactions fall into them: a reference window
+    used for scoring, and the latest window being filled. When the latest window is full it
+    becomes the reference. Scoring and updating cost O(n_trees * depth) per event, independent
+    of how much data has been seen, and memory is fixed at construction.
+
+    Inputs are scaled to [0, 1] with fixed ranges (DEFAULT_FEATURE_RANGES unless given);
+    amount is log-scaled because of its heavy tail.
+    """
+
+    detector_type = "half_space_trees"
+    supports_partial_update = True
+
+    def __init__(self, n_trees=25, depth=8, window_size=2000, contamination=0.01, size_limit=None,
+                 feature_ranges=None, log_features=("amount",), random_state=42):
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        self.contamination = contamination
+        # Stop descending once a node's reference mass is this small (the paper's sizeLimit)
+        self.size_limit = size_limit if size_limit is not None else max(1, window_size // 100)
+        self.feature_ranges = dict(DEFAULT_FEATURE_RANGES, **(feature_ranges or {})) # {feature: (low, high)}
+        self.log_features = tuple(log_features)
+        self.random_state = random_state
+        self._initialized = False
+
+    # --- Internal helpers ---
+    def _transform(self, X):
+        X = _as_matrix(X).copy()
+        for i, feature in enumerate(FEATURE_NAMES):
+            if feature in self.log_features:
+                X[:, i] = np.log1p(np.clip(X[:, i], 0, None))
+        return X
+
+    def _scale(self, X):
+        return np.clip((X - self._low) / self._span, 0.0, 1.0)
+
+    def _initialize(self, X_transformed):
+        n_features = X_transformed.shape[1]
+        # Features without a configured range take theirs from the first batch
+        observed_low, observed_high = X_transformed.min(axis=0), X_transformed.max(axis=0)
+        low, high = np.empty(n_features), np.empty(n_features)
+        for i, feature in enumerate(FEATURE_NAMES):
+            low[i], high[i] = self.feature_ranges.get(feature, (observed_low[i], observed_high[i]))
+        self._low = low
+        self._span = np.where(high > low, high - low, 1.0)
+
+        # Build random trees over a perturbed work space, stored level by level in heap order
+        rng = np.random.RandomState(self.random_state)
+        n_internal = 2 ** self.depth - 1
+        self._split_feature = rng.randint(0, n_features, size=(self.n_trees, n_internal))
+        self._split_value = np.empty((self.n_trees, n_internal))
+        for t in range(self.n_trees):
+            s = rng.uniform(0, 1, n_features)
+            radius = 2 * np.maximum(s, 1 - s)
+            node_min, node_max = np.empty((n_internal, n_features)), np.empty((n_internal, n_features))
+            node_min[0], node_max[0] = s - radius, s + radius
+            for node in range(n_internal):
+                f = self._split_feature[t, node]
+                mid = (node_min[node, f] + node_max[node, f]) / 2
+                self._split_value[t, node] = mid
+                for child, bound in ((2 * node + 1, "max"), (2 * node + 2, "min")):
+                    if child < n_internal:
+                        node_min[child], node_max[child] = node_min[node], node_max[node]
+                        (node_max if bound == "max" else node_min)[child, f] = mid
+
+        n_nodes = 2 ** (self.depth + 1) - 1
+        self._reference_mass = np.zeros((self.n_trees, n_nodes))
+        self._latest_mass = np.zeros((self.n_trees, n_nodes))
+        self._window_count = 0
+        self._window_rows = np.empty((self.window_size, n_features)) # Scaled rows of the latest window, for calibration
+        self._has_reference = False
+        self._offset = 0.0
+        self._initialized = True
+
+    def _paths(self, X_scaled):
+        """Node index visited at every level of every tree: shape (n_trees, depth + 1, n_rows)."""
+        n_rows = len(X_scaled)
+        tree_index = np.arange(self.n_trees)[:, None]
+        node = np.zeros((self.n_trees, n_rows), dtype=np.int64)
+        paths = np.empty((self.n_trees, self.depth + 1, n_rows), dtype=np.int64)
+        paths[:, 0] = node
+        for level in range(self.depth):
+            features = self._split_feature[tree_index, node]
+            values = X_scaled[np.arange(n_rows)[None, :], features]
+            node = 2 * node + 1 + (values > self._split_value[tree_index, node])
+            paths[:, level + 1] = node
+        return paths
+
+    def _raw_scores(self, paths):
+        """Mass-weighted HST score from the reference window (higher = more normal)."""
+        tree_index = np.arange(self.n_trees)[:, None, None]
+        mass = self._reference_mass[tree_index, paths] # (n_trees, depth + 1, n_rows)
+        level_weight = (2.0 ** np.arange(self.depth + 1))[None, :, None]
+        # Score at the first node on the path whose mass falls below the size limit (or at the leaf)
+        below_limit = mass < self.size_limit
+        stop_level = np.where(below_limit.any(axis=1), below_limit.argmax(axis=1), self.depth)
+        stopped_mass = np.take_along_axis(mass, stop_level[:, None, :], axis=1)[:, 0, :]
+        return (stopped_mass * level_weight[0, stop_level, 0]).sum(axis=0)
+
+    def _record(self, paths):
+        tree_index = np.broadcast_to(np.arange(self.n_trees)[:, None, None], paths.shape)
+        np.add.at(self._latest_mass, (tree_index.ravel(), paths.ravel()), 1)
+
+    # --- Detector interface ---
+    def fit(self, X):
+        """Initializes the trees and fills the reference window from a batch (optional warm start)."""
+        X_transformed = self._transform(X)
+        self._initialize(X_transformed)
+        return self.partial_update(X)
+
+    def partial_update(self, X):
+        X_transformed = self._transform(X)
+        if not self._initialized:
+            # Cold start: build the trees on the first micro-batch; scoring starts after one full window
+            self._initialize(X_transformed)
+        X_scaled = self._scale(X_transformed)
+
+        start = 0
+        while start < len(X_scaled):
+            # Split the batch at window boundaries so each event lands in the right window
+            end = min(len(X_scaled), start + self.window_size - self._window_count)
+            self._record(self._paths(X_scaled[start:end]))
+            self._window_rows[self._window_count:self._window_count + end - start] = X_scaled[start:end]
+            self._window_count += end - start
+            start = end
+
+            if self._window_count == self.window_size:
+                self._rotate_window()
+        return self
+
+    def _rotate_window(self):
+        # The latest window becomes the reference for scoring
+        self._reference_mass, self._latest_mass = self._latest_mass, self._reference_mass
+        self._latest_mass[:] = 0
+        self._window_count = 0
+        self._has_reference = True
+        # Recalibrate the threshold so about `contamination` of the window scores below 0,
+        # the same convention IsolationForest uses for its offset
+        self._offset = np.quantile(self._raw_scores(self._paths(self._window_rows)), self.contamination)
+
+    @property
+    def ready(self):
+        """True once a full window has been seen and the detector can score."""
+        return self._initialized and self._has_reference
+
+    @property
+    def min_training_rows(self):
+        return self.window_size
+
+    def score_batch(self, X):
+        if not self.ready:
+            raise ValueError("HalfSpaceTreesDetector needs at least one full window of data before scoring")
+        paths = self._paths(self._scale(self._transform(X)))
+        return (self._raw_scores(paths) - self._offset) / (self.window_size * self.n_trees)
+
+    def get_state(self):
+        return dict(self.__dict__)
+
+    def set_state(self, state):
+        self.__dict__.update(state)
+
+DETECTORS = {cls.detector_type: cls for cls in (IsolationForestDetector, HalfSpaceTreesDetector)}
+
+def create_detector(detector_type="isolation_forest", **params):
+    """Creates a detector by name, e.g. create_detector("half_space_trees", window_size=5000)."""
+    if detector_type not in DETECTORS:
+        raise ValueError(f"Unknown detector type '{detector_type}'. Available: {sorted(DETECTORS)}")
+    return DETECTORS[detector_type](**params)
+
+def load_detector(path):
+    """Loads a detector written by serialize(). Plain sklearn IsolationForest artifacts from older runs are wrapped."""
+    payload = joblib.load(path)
+    if isinstance(payload, IsolationForest):
+        return IsolationForestDetector.from_estimator(payload)
+    detector = DETECTORS[payload["detector_type"]].__new__(DETECTORS[payload["detector_type"]])
+    detector.set_state(payload["state"])
+    return detector
@@ -0,0 +1,54 @@
+# src/models/drift.py
+# Builds the training-time distribution baselines that the Azure Function compares live
+# traffic against (see AnomalyHubTrigger/drift_monitor.py).
+#
+# Each baseline is a fixed-bin histogram: a list of bin edges and the share of training
+# rows in each bin. The edges are stored with the baseline, so the Function bins live
+# values exactly as training did without importing this module.
+import json
+import numpy as np
+
+from detectors import FEATURE_NAMES
+
+DRIFT_BASELINE_FILENAME = "drift_baseline.json" # Saved next to the model artifact
+
+# Fixed bin edges per monitored quantity. The outer edges are open-ended: values outside
+# the range are counted in the first or last bin.
+BIN_EDGES = {
+    # Log-spaced, because amounts are heavy-tailed ($1 to $100k)
+    'amount': [0.0] + np.geomspace(1, 100_000, 30).round(2).tolist(),
+    # One bin per hour of the day
+    'transaction_hour': np.arange(0, 25).tolist(),
+    # Anomaly scores follow the IsolationForest convention and mostly fall in [-0.5, 0.5]
+    'anomaly_score': np.linspace(-0.5, 0.5, 41).round(4).tolist()
+}
+
+def histogram(values, edges):
+    """Counts values into fixed bins. Values outside the edges go to the first or last bin."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    edges = np.asarray(edges, dtype=float)
+    bins = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+    return np.bincount(bins, minlength=len(edges) - 1)
+
+def build_baseline(df, anomaly_scores, model_version=None):
+    """
+    Summarizes the training data as one histogram per feature plus one for the model's
+    anomaly scores. The result is plain JSON-serializable data, a few KB in size.
+    """
+    columns = {feature: df[feature].to_numpy() for feature in FEATURE_NAMES}
+    columns['anomaly_score'] = np.asarray(anomaly_scores)
+
+    baseline = {"n_rows": int(len(df)), "model_version": model_version, "histograms": {}}
+    for name, values in columns.items():
+        counts = histogram(values, BIN_EDGES[name])
+        baseline["histograms"][name] = {
+            "edges": BIN_EDGES[name],
+            "proportions": (counts / max(counts.sum(), 1)).round(6).tolist()
+        }
+    return baseline
+
+def save_baseline(baseline, path=DRIFT_BASELINE_FILENAME):
+    with open(path, "w") as f:
+        json.dump(baseline, f)
+    return path
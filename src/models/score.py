@@ -2,24 +2,375 @@
 import json
 import numpy as np
 import os
-import joblib
+import glob
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd # Make sure pandas is installed in your scoring environment
-from azureml.core.model import Model
+try:
+    from azureml.core.model import Model
+except ImportError: # Outside the AML runtime (e.g. serve.py), models are only found under AZUREML_MODEL_DIR
+    Model = None
+from detectors import FEATURE_NAMES, format_explanations, load_detector # Deploy detectors.py alongside score.py
+
+# --- Model Registry Configuration ---
+# These can be set as environment variables on the AML deployment
+MODEL_NAME = os.environ.get("MODEL_NAME", "anomaly-detection-model") # Name used during registration in train.py
+SERVING_MODEL_VERSION = os.environ.get("SERVING_MODEL_VERSION", "latest") # Pin a version (e.g. "3") or follow the newest artifact
+SHADOW_MODEL_VERSION = os.environ.get("SHADOW_MODEL_VERSION") # Candidate version to shadow-score; unset disables shadow scoring
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "0.0")) # Fraction of requests mirrored to the shadow model
+MODEL_POLL_INTERVAL_SECONDS = float(os.environ.get("MODEL_POLL_INTERVAL_SECONDS", "60")) # 0 disables hot-swap polling
+# AZUREML_MODEL_DIR is filled once when the deployment is created or updated, so new versions can only
+# appear while the container runs in a storage path mounted into it (see train.py --publish-dir)
+MODEL_WATCH_DIR = os.environ.get("MODEL_WATCH_DIR") # <model_name>/<version>/<artifact>; unset disables hot-swap
+MAX_LOADED_MODEL_VERSIONS = int(os.environ.get("MAX_LOADED_MODEL_VERSIONS", "3")) # Upper bound on versions kept in memory
+# --- End Model Registry Configuration ---
+
+# --- Segment Model Configuration ---
+SEGMENT_MODEL_NAME = os.environ.get("SEGMENT_MODEL_NAME", "anomaly-segment-models") # Registered by train.py --segment-columns
+SEGMENT_MODEL_DIR = os.environ.get("SEGMENT_MODEL_DIR") # Overrides the lookup under AZUREML_MODEL_DIR
+MAX_LOADED_SEGMENT_MODELS = int(os.environ.get("MAX_LOADED_SEGMENT_MODELS", "256")) # LRU bound on segment models in memory
+SEGMENT_MANIFEST_FILENAME = "manifest.json" # Must match train.py
+# --- End Segment Model Configuration ---
 
 # --- Global variables for model and features ---
-model = None
-feature_names = ['amount', 'transaction_hour'] # Must match features used during training
+registry = None
+shadow_scorer = None
+segment_router = None
+feature_names = FEATURE_NAMES # Must match features used during training
+
+MODEL_FILE_PATTERNS = ("*.joblib", "*.pkl")
+
+def _find_model_file(directory):
+    """Returns the first model artifact found in a directory, or None."""
+    for pattern in MODEL_FILE_PATTERNS:
+        matches = sorted(glob.glob(os.path.join(directory, pattern)))
+        if matches:
+            return matches[0]
+    return None
+
+def _version_sort_key(version):
+    # Registered versions are integers, but keep non-numeric names sortable
+    return (0, int(version), "") if str(version).isdigit() else (1, 0, str(version))
+
+class ModelRegistry:
+    """
+    Holds several versions of the registered model in memory.
+
+    Versions are discovered under AZUREML_MODEL_DIR, which Azure ML lays out as
+    <model_name>/<version>/<artifact> when several versions are attached to a deployment.
+    That directory does not change while the container runs; versions published later are
+    picked up from watch_root, a mounted storage path with the same layout. The serving model is swapped by replacing a single (version, model) tuple, so a request
+    always scores against one consistent version, even while a swap is in progress.
+    """
+
+    def __init__(self, model_root, model_name, serving_version="latest", max_loaded_versions=3, watch_root=None):
+        self.model_root = model_root
+        self.watch_root = watch_root
+        self.model_name = model_name
+        self.serving_version = serving_version
+        self.max_loaded_versions = max(1, max_loaded_versions)
+        self.pinned_versions = set() # Versions that must never be evicted (e.g. the shadow candidate)
+        self._models = OrderedDict() # version -> loaded model, in least-recently-used order
+        self._lock = threading.Lock()
+        self._serving = (None, None) # (version, model), replaced atomically on swap
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+    @property
+    def serving(self):
+        return self._serving
+
+    def discover_versions(self):
+        """Maps each available model version to its artifact path."""
+        versions = {}
+        if self.model_root and os.path.isdir(self.model_root):
+            model_dir = os.path.join(self.model_root, self.model_name)
+            if os.path.isdir(model_dir):
+                # Multi-version layout: <root>/<model_name>/<version>/<artifact>
+                for entry in os.listdir(model_dir):
+                    artifact = _find_model_file(os.path.join(model_dir, entry))
+                    if artifact:
+                        versions[entry] = artifact
+            else:
+                # Single-version layout: <root>/<artifact>, root usually ends in the version number
+                artifact = _find_model_file(self.model_root)
+                if artifact:
+                    versions[os.path.basename(os.path.normpath(self.model_root))] = artifact
+        watch_dir = os.path.join(self.watch_root, self.model_name) if self.watch_root else None
+        if watch_dir and os.path.isdir(watch_dir):
+            for entry in os.listdir(watch_dir):
+                if entry in versions or entry.startswith("."): # Hidden entries are publishes in progress
+                    continue
+                artifact = _find_model_file(os.path.join(watch_dir, entry))
+                if artifact:
+                    versions[entry] = artifact
+        if not versions:
+            if Model is None:
+                raise FileNotFoundError(f"No model artifact found under {self.model_root} and the Azure ML SDK is not installed")
+            # Fall back to the SDK lookup used before multi-version support
+            versions["current"] = Model.get_model_path(self.model_name)
+        return versions
+
+    def _resolve_serving_version(self, versions):
+        if self.serving_version != "latest":
+            if self.serving_version not in versions:
+                raise ValueError(f"Model version {self.serving_version} not found. Available: {sorted(versions)}")
+            return self.serving_version
+        return max(versions, key=_version_sort_key)
+
+    def get(self, version, versions=None):
+        """Returns a loaded model version, loading it on first use."""
+        with self._lock:
+            if version in self._models:
+                self._models.move_to_end(version)
+                return self._models[version]
+
+        versions = versions or self.discover_versions()
+        if version not in versions:
+            raise ValueError(f"Model version {version} not found. Available: {sorted(versions)}")
+
+        # Deserialize outside the lock so scoring of already-loaded versions is never blocked
+        loaded_model = load_detector(versions[version])
+        print(f"Model version {version} loaded from: {versions[version]}")
+
+        with self._lock:
+            self._models[version] = loaded_model
+            self._models.move_to_end(version)
+            self._evict(keep={version}) # May be about to become the serving version
+        return loaded_model
+
+    def _evict(self, keep=()):
+        # Caller holds the lock. Drop least-recently-used versions that are not in use.
+        protected = set(self.pinned_versions) | {self._serving[0]} | set(keep)
+        for version in list(self._models):
+            if len(self._models) <= self.max_loaded_versions:
+                break
+            if version not in protected:
+                del self._models[version]
+                print(f"Model version {version} evicted from memory.")
+
+    def refresh(self):
+        """Loads the target serving version and swaps it in if it changed. Returns True on swap."""
+        versions = self.discover_versions()
+        target_version = self._resolve_serving_version(versions)
+        if target_version == self._serving[0]:
+            return False
+
+        new_model = self.get(target_version, versions) # Fully loaded before it becomes visible
+        previous_version = self._serving[0]
+        self._serving = (target_version, new_model)
+        print(f"Serving model swapped: {previous_version} -> {target_version}")
+        return True
+
+    def start_watcher(self, interval_seconds):
+        """Polls watch_root for new model artifacts in a background thread and hot-swaps them in."""
+        if interval_seconds <= 0 or self._watcher is not None:
+            return
+        if not self.watch_root:
+            print("Model hot-swap disabled: MODEL_WATCH_DIR is not set. Versions attached to the deployment "
+                  "can still be selected with SERVING_MODEL_VERSION; new versions need a deployment update.")
+            return
+
+        def _watch():
+            while not self._stop_event.wait(interval_seconds):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    # Keep serving the current version if a new artifact is incomplete or broken
+                    print(f"Error refreshing model registry: {e}")
+
+        self._watcher = threading.Thread(target=_watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_event.set()
+
+class ShadowScorer:
+    """
+    Scores a sampled fraction of requests with a candidate model version.
+
+    Shadow scoring runs on a single background thread and never touches the response.
+    When the thread falls behind, new shadow requests are dropped rather than queued,
+    so a slow candidate cannot build up memory or add latency.
+    """
+
+    def __init__(self, registry, version, sample_rate, max_pending=8):
+        self.registry = registry
+        self.version = version
+        self.sample_rate = sample_rate
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-scorer")
+        self._pending = threading.BoundedSemaphore(max_pending)
+        registry.pinned_versions.add(version)
+
+    def maybe_submit(self, X, serving_version, serving_scores):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        if not self._pending.acquire(blocking=False):
+            return False # Backlog full, skip this sample
+        try:
+            self._executor.submit(self._score, X, serving_version, serving_scores)
+        except Exception:
+            self._pending.release()
+            raise
+        return True
+
+    def _score(self, X, serving_version, serving_scores):
+        try:
+            start = time.perf_counter()
+            candidate_model = self.registry.get(self.version)
+            candidate_scores = candidate_model.score_batch(X)
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            # Log a compact comparison; these lines end up in Application Insights for the deployment
+            print("Shadow scoring: " + json.dumps({
+                "serving_version": serving_version,
+                "shadow_version": self.version,
+                "n_rows": len(candidate_scores),
+                "prediction_agreement": float(np.mean((candidate_scores < 0) == (serving_scores < 0))),
+                "mean_abs_score_diff": float(np.mean(np.abs(candidate_scores - serving_scores))),
+                "shadow_anomalies": int(np.sum(candidate_scores < 0)),
+                "serving_anomalies": int(np.sum(serving_scores < 0)),
+                "shadow_latency_ms": round(latency_ms, 3)
+            }))
+        except Exception as e:
+            print(f"Error during shadow scoring: {e}")
+        finally:
+            self._pending.release()
+
+class SegmentModelRouter:
+    """
+    Routes each row to the model trained for its segment (e.g. its merchant_id).
+
+    Only the manifest is read up front. Segment models are loaded on first use and kept in a
+    bounded LRU, so thousands of segments can be served without holding them all in memory.
+    Rows whose segment has no model are scored by the global serving model.
+    """
+
+    def __init__(self, segment_dir, max_loaded_models=256):
+        self.segment_dir = segment_dir
+        self.max_loaded_models = max(1, max_loaded_models)
+        with open(os.path.join(segment_dir, SEGMENT_MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+        self.segment_columns = manifest["segment_columns"] # Routing priority: first matching column wins
+        self.segments = manifest["segments"]
+        self._models = OrderedDict() # (column, value) -> loaded model, in least-recently-used order
+        self._failed = set() # Segments whose artifact could not be loaded or cannot score yet; served by the global model
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def find_segment_dir(model_root, model_name):
+        """Returns the newest registered segment model directory under model_root, or None."""
+        model_dir = os.path.join(model_root or "", model_name)
+        if not os.path.isdir(model_dir):
+            return None
+        candidates = []
+        for version in os.listdir(model_dir):
+            # Directory artifacts keep their folder name below the version directory
+            for manifest_path in glob.glob(os.path.join(model_dir, version, "**", SEGMENT_MANIFEST_FILENAME), recursive=True):
+                candidates.append((_version_sort_key(version), os.path.dirname(manifest_path)))
+        return max(candidates)[1] if candidates else None
+
+    def get(self, segment_column, segment_value):
+        """Returns the model for a segment, loading it on first use, or None if there is none."""
+        key = (segment_column, segment_value)
+        entry = self.segments.get(segment_column, {}).get(segment_value)
+        if entry is None or key in self._failed:
+            return None
+
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+
+        try:
+            segment_model = load_detector(os.path.join(self.segment_dir, entry["path"]))
+        except Exception as e:
+            print(f"Error loading segment model {segment_column}={segment_value}: {e}")
+            with self._lock:
+                self._failed.add(key)
+            return None
+
+        if not segment_model.ready:
+            # e.g. a Half-Space Trees model saved before its first window was complete
+            print(f"Segment model {segment_column}={segment_value} is not ready to score; using the global model.")
+            with self._lock:
+                self._failed.add(key)
+            return None
+
+        with self._lock:
+            self._models[key] = segment_model
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_loaded_models:
+                self._models.popitem(last=False)
+        return segment_model
+
+    def score(self, df_input, fallback_model, explain=False):
+        """
+        Scores each row with its segment model, grouping rows so each model is called once per request.
+        Returns (scores, scored_by, explanations); explanations are None unless requested.
+        """
+        anomaly_scores = np.empty(len(df_input))
+        scored_by = np.full(len(df_input), "global", dtype=object)
+        explanations = np.full(len(df_input), None, dtype=object)
+        unrouted = np.ones(len(df_input), dtype=bool)
+
+        for segment_column in self.segment_columns:
+            if segment_column not in df_input.columns or not unrouted.any():
+                continue
+            # Manifest keys are strings; missing values become "None"/"nan" and never match a segment
+            segment_values = np.array([str(value) for value in df_input[segment_column]], dtype=object)
+            for segment_value in np.unique(segment_values[unrouted]):
+                segment_model = self.get(segment_column, segment_value)
+                if segment_model is None:
+                    continue
+                rows = unrouted & (segment_values == segment_value)
+                anomaly_scores[rows], explanations[rows] = score_rows(segment_model, df_input.loc[rows, feature_names], explain)
+                scored_by[rows] = f"{segment_column}={segment_value}"
+                unrouted &= ~rows
+
+        if unrouted.any():
+            anomaly_scores[unrouted], explanations[unrouted] = score_rows(fallback_model, df_input.loc[unrouted, feature_names], explain)
+        return anomaly_scores, scored_by.tolist(), explanations.tolist()
+
+def score_rows(model, X, explain=False):
+    """
+    Scores rows with one model. With explain, per-row explanations come from the same pass
+    over the trees as the scores; models without explanation support return None for each row.
+    """
+    if explain and model.supports_explanations:
+        anomaly_scores, explanations = model.score_and_explain(X)
+        return anomaly_scores, format_explanations(explanations)
+    return model.score_batch(X), [None] * len(X)
 
 def init():
     """
     This function is called when the container is initialized.
     You can deserialize the model here to make it ready for inference.
     """
-    global model
-    # Azure ML automatically downloads the registered model to the 'AZUREML_MODEL_DIR' env var
-    model_path = Model.get_model_path('anomaly-detection-model') # Name used during registration in train.py
-    model = joblib.load(model_path)
-    print(f"Model loaded from: {model_path}")
+    global registry, shadow_scorer, segment_router
+    # Azure ML automatically downloads the registered model(s) to the 'AZUREML_MODEL_DIR' env var
+    registry = ModelRegistry(
+        os.environ.get("AZUREML_MODEL_DIR"),
+        MODEL_NAME,
+        serving_version=SERVING_MODEL_VERSION,
+        max_loaded_versions=MAX_LOADED_MODEL_VERSIONS,
+        watch_root=MODEL_WATCH_DIR
+    )
+    if SHADOW_MODEL_VERSION and SHADOW_SAMPLE_RATE > 0:
+        shadow_scorer = ShadowScorer(registry, SHADOW_MODEL_VERSION, SHADOW_SAMPLE_RATE)
+    registry.refresh()
+    registry.start_watcher(MODEL_POLL_INTERVAL_SECONDS)
+    print(f"Serving model version: {registry.serving[0]}")
+
+    # Per-segment models are optional; without them every row is scored by the global model
+    segment_dir = SEGMENT_MODEL_DIR or SegmentModelRouter.find_segment_dir(os.environ.get("AZUREML_MODEL_DIR"), SEGMENT_MODEL_NAME)
+    if segment_dir:
+        segment_router = SegmentModelRouter(segment_dir, max_loaded_models=MAX_LOADED_SEGMENT_MODELS)
+        n_segments = sum(len(values) for values in segment_router.segments.values())
+        print(f"Segment routing enabled on {segment_router.segment_columns} ({n_segments} segment models) from: {segment_dir}")
 
 def run(raw_data):
     """
@@ -28,6 +379,8 @@ def run(raw_data):
         raw_data: A JSON string representing the input data.
                   Expected format: [{"amount": 123.45, "transaction_hour": 14}] or [{"timestamp": "...", "amount": 123.45}]
                   The `run` function in `score.py` will expect the *pre-processed* features.
+                  Optional segment keys (e.g. "merchant_id") route a row to its per-segment model.
+                  To get per-feature explanations, wrap the rows: {"data": [...], "explain": true}.
                   The Azure Function will perform the transformation to this format.
     Returns:
         A JSON object containing prediction results.
@@ -36,6 +389,11 @@ def run(raw_data):
         # The raw_data input to this run function *should* be the pre-processed features
         # sent by the Azure Function. So, we expect a list of dicts.
         data_list = json.loads(raw_data) # Expecting a list like [{"amount": ..., "transaction_hour": ...}]
+        explain = False
+        if isinstance(data_list, dict):
+            # Envelope form with request options
+            explain = bool(data_list.get("explain", False))
+            data_list = data_list["data"]
 
         df_input = pd.DataFrame(data_list)
 
@@ -46,13 +404,29 @@ def run(raw_data):
         # Select and order features correctly
         X_inference = df_input[feature_names]
 
-        # Predict anomaly scores (Isolation Forest outputs scores)
+        # Read the serving model once so the whole request uses one version, even during a hot-swap
+        model_version, model = registry.serving
+
+        # Predict anomaly scores with the detector interface (see detectors.py)
         # Lower score indicates higher anomaly likelihood
-        anomaly_scores = model.decision_function(X_inference).tolist()
+        if segment_router is not None:
+            # Rows carrying a segment key (e.g. merchant_id) use that segment's model when one exists
+            anomaly_scores_array, scored_by, explanations = segment_router.score(df_input, model, explain)
+        else:
+            anomaly_scores_array, explanations = score_rows(model, X_inference, explain)
+            scored_by = ["global"] * len(df_input)
+        anomaly_scores = anomaly_scores_array.tolist()
+
+        # Mirror a sample of traffic to the candidate model; this returns immediately.
+        # The candidate is a global model, so only rows the serving global model scored are compared.
+        if shadow_scorer is not None:
+            global_rows = np.asarray(scored_by) == "global"
+            if global_rows.any():
+                shadow_scorer.maybe_submit(X_inference[global_rows], model_version, anomaly_scores_array[global_rows])
 
         # Optional: Classify as anomaly based on a threshold (e.g., score < 0 indicates anomaly by default IF)
         # Adjust threshold based on your model's performance requirements
-        predictions = (np.array(anomaly_scores) < 0).astype(int).tolist() # IsolationForest scores <0 usually anomalies
+        predictions = (anomaly_scores_array < 0).astype(int).tolist() # Detector scores <0 are anomalies
 
         # You can enrich the output with original data or more details
         results = []
@@ -60,6 +434,10 @@ def run(raw_data):
             result = data_list[i] # Use the already parsed and transformed input
             result['anomaly_score'] = anomaly_scores[i]
             result['is_anomaly_predicted'] = bool(predictions[i])
+            result['model_version'] = model_version
+            result['scored_by'] = scored_by[i]
+            if explain:
+                result['explanation'] = explanations[i] # Which features isolated the transaction
             results.append(result)
 
         return json.dumps(results)
@@ -77,6 +455,8 @@ if __name__ == '__main__':
     # Sample pre-processed data that the Azure Function would send
     sample_data_good = '[{"amount": 100.0, "transaction_hour": 10}]'
     sample_data_anomaly = '[{"amount": 10000.0, "transaction_hour": 15}]'
+    sample_data_explained = '{"data": [{"amount": 10000.0, "transaction_hour": 3}], "explain": true}'
 
     print(f"Good data prediction: {run(sample_data_good)}")
-    print(f"Anomaly data prediction: {run(sample_data_anomaly)}")
\ No newline at end of file
+    print(f"Anomaly data prediction: {run(sample_data_anomaly)}")
+    print(f"Explained prediction: {run(sample_data_explained)}")
@@ -0,0 +1,333 @@
+# src/models/serve.py
+# Local, offline stand-in for the Azure ML online endpoint, wrapping score.init() / score.run().
+#
+# - asyncio HTTP front end (stdlib only): POST /score takes the same payloads as the AML endpoint
+# - dynamic batcher: concurrent requests are merged into one score.run() call, flushed when
+#   max_batch_size rows are waiting or max_delay_ms after the first one arrived
+# - pre-forked workers: the model is loaded once in the parent and the workers are forked
+#   from it, so they share its memory copy-on-write and all accept on one listening socket
+#
+# Usage:
+#   python serve.py --model-dir azureml-models             # serve on :5001 (AZUREML_MODEL_DIR layout)
+#   python serve.py --benchmark [--model-dir azureml-models]  # throughput vs. a non-batching baseline
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import score
+
+# --- Server Configuration ---
+DEFAULT_PORT = int(os.environ.get("SERVE_PORT", "5001"))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "256")) # Rows per model call
+MAX_BATCH_DELAY_MS = float(os.environ.get("MAX_BATCH_DELAY_MS", "5")) # Longest a request waits for others to join its batch
+N_WORKERS = int(os.environ.get("SERVE_WORKERS", str(os.cpu_count() or 1)))
+# --- End Server Configuration ---
+
+class DynamicBatcher:
+    """
+    Merges concurrently submitted requests into one score.run() call.
+
+    The first queued request opens a batch, which is flushed once it holds max_batch_size
+    rows or max_delay_seconds have passed. The model runs on a single background thread, so
+    the event loop keeps accepting requests, which form the next batch while this one scores.
+    With max_batch_size=1 every request is scored on its own (the non-batching baseline).
+    """
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_delay_seconds=MAX_BATCH_DELAY_MS / 1000):
+        self.max_batch_size = max_batch_size
+        self.max_delay_seconds = max_delay_seconds
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+        self.n_batches = 0
+        self.n_rows = 0
+
+    async def submit(self, rows, explain=False):
+        """Queues one request's rows and waits for its part of the batched result."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, explain, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_delay_seconds
+            while n_rows < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(item)
+                n_rows += len(item[0])
+
+            self.n_batches += 1
+            self.n_rows += n_rows
+            try:
+                results = await loop.run_in_executor(self._executor, self._score, batch)
+                for (_, _, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result({"error": str(e)})
+
+    @staticmethod
+    def _score(batch):
+        # Runs on the model thread. Requests asking for explanations are scored separately,
+        # so the others do not pay for them.
+        results = [None] * len(batch)
+        for explain in (False, True):
+            indices = [i for i, (_, item_explain, _) in enumerate(batch) if item_explain == explain]
+            if not indices:
+                continue
+            rows = [row for i in indices for row in batch[i][0]]
+            payload = {"data": rows, "explain": True} if explain else rows
+            output = json.loads(score.run(json.dumps(payload)))
+            if isinstance(output, dict):
+                # One bad request fails the merged call; score each alone so only it gets the error
+                for i in indices:
+                    single = {"data": batch[i][0], "explain": True} if explain else batch[i][0]
+                    results[i] = json.loads(score.run(json.dumps(single)))
+                continue
+            offset = 0
+            for i in indices:
+                results[i] = output[offset:offset + len(batch[i][0])]
+                offset += len(batch[i][0])
+        return results
+
+class ScoringServer:
+    """Minimal HTTP/1.1 server (keep-alive, Content-Length bodies) in front of a DynamicBatcher."""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def _route(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if method == "GET" and path in ("/", "/health"):
+            return 200, {"status": "ok", "model_version": score.registry.serving[0], "pid": os.getpid(),
+                         "batches": self.batcher.n_batches, "rows": self.batcher.n_rows}
+        if method == "POST" and path in ("/", "/score"):
+            # Same payloads as score.run: a list of rows, or {"data": [...], "explain": true}
+            try:
+                payload = json.loads(body)
+                explain = isinstance(payload, dict) and bool(payload.get("explain", False))
+                rows = payload["data"] if isinstance(payload, dict) else payload
+                if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+                    raise ValueError("Expected a non-empty list of transactions")
+                # Checked per request, as score.run would: once merged, another request's columns could hide a gap
+                columns = list(dict.fromkeys(key for row in rows for key in row))
+                if not all(feature in columns for feature in score.feature_names):
+                    raise ValueError(f"Input data missing required features. Expected: {score.feature_names}, Got: {columns}")
+            except (ValueError, KeyError, TypeError) as e:
+                # The AML endpoint reports scoring errors in the body, not the status code
+                return 200, {"error": str(e)}
+            return 200, await self.batcher.submit(rows, explain)
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, response = await self._route(method, path, body)
+                response_body = json.dumps(response).encode()
+                writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(response_body)}\r\n\r\n".encode()
+                             + response_body)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # Client went away or sent something that is not HTTP
+        finally:
+            writer.close()
+
+async def _serve_worker(sock, max_batch_size, max_delay_ms):
+    batcher = DynamicBatcher(max_batch_size, max_delay_ms / 1000)
+    batcher_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(ScoringServer(batcher).handle_connection, sock=sock)
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+
+def _worker_main(sock, max_batch_size, max_delay_ms, poll_interval):
+    # Threads do not survive fork, so each worker starts its own hot-swap watcher
+    # and its own shadow scorer (whose executor thread would otherwise be the parent's)
+    score.registry.start_watcher(poll_interval)
+    if score.shadow_scorer is not None:
+        shadow = score.shadow_scorer
+        score.shadow_scorer = score.ShadowScorer(score.registry, shadow.version, shadow.sample_rate)
+    try:
+        asyncio.run(_serve_worker(sock, max_batch_size, max_delay_ms))
+    except KeyboardInterrupt:
+        pass
+
+def _warm_up():
+    # Score once before forking so lazily built state (e.g. explanation tables) is shared by all workers
+    sample = [{"amount": 100.0, "transaction_hour": 12}]
+    shadow, score.shadow_scorer = score.shadow_scorer, None # Warm-up requests are not traffic to mirror
+    try:
+        score.run(json.dumps(sample))
+        score.run(json.dumps({"data": sample, "explain": True}))
+    finally:
+        score.shadow_scorer = shadow
+    if shadow is not None:
+        score.registry.get(shadow.version) # Load the candidate before forking too
+
+def serve(host="0.0.0.0", port=DEFAULT_PORT, n_workers=N_WORKERS, max_batch_size=MAX_BATCH_SIZE,
+          max_delay_ms=MAX_BATCH_DELAY_MS, sock=None, ready_event=None):
+    """Loads the model, forks n_workers processes that accept on one socket, and blocks until interrupted."""
+    poll_interval = score.MODEL_POLL_INTERVAL_SECONDS
+    score.MODEL_POLL_INTERVAL_SECONDS = 0 # The parent does not serve; workers start their own watchers
+    # Unlike AZUREML_MODEL_DIR in a deployment, a local model directory can gain versions while serving
+    score.MODEL_WATCH_DIR = score.MODEL_WATCH_DIR or os.environ.get("AZUREML_MODEL_DIR")
+    score.init()
+    _warm_up()
+
+    sock = sock or socket.create_server((host, port), backlog=4096)
+    context = multiprocessing.get_context("fork") # Fork so workers share the loaded model pages
+    workers = [context.Process(target=_worker_main, args=(sock, max_batch_size, max_delay_ms, poll_interval), daemon=True)
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    # Turn SIGTERM into a normal exit so the workers below are stopped too, not orphaned
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Serving on {sock.getsockname()} with {n_workers} workers "
+          f"(max_batch_size={max_batch_size}, max_delay_ms={max_delay_ms})", flush=True)
+    if ready_event is not None:
+        ready_event.set()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+
+# --- Benchmark ---
+async def _client(host, port, payload, deadline, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (f"POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(payload)}\r\n\r\n").encode() + payload
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            await reader.readline() # Status line
+            content_length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    content_length = int(line.split(b":", 1)[1])
+            await reader.readexactly(content_length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+async def _load(host, port, concurrency, duration_seconds):
+    payload = json.dumps([{"amount": 250.0, "transaction_hour": 14}]).encode() # One transaction per request
+    latencies = []
+    deadline = time.perf_counter() + duration_seconds
+    await asyncio.gather(*(_client(host, port, payload, deadline, latencies) for _ in range(concurrency)))
+    return latencies
+
+def _demo_model_dir():
+    # Offline fallback: train a model on generated transactions in the AZUREML_MODEL_DIR layout
+    from benchmark_detectors import load_events
+    from detectors import FEATURE_NAMES, IsolationForestDetector
+    model_dir = tempfile.mkdtemp(prefix="serve-models-")
+    version_dir = os.path.join(model_dir, score.MODEL_NAME, "1")
+    os.makedirs(version_dir)
+    detector = IsolationForestDetector(contamination=0.01).fit(load_events(None, 20_000, 42)[FEATURE_NAMES])
+    detector.serialize(os.path.join(version_dir, "anomaly_isolation_forest_model.joblib"))
+    return model_dir
+
+def benchmark(n_workers, max_batch_size, max_delay_ms, concurrency, duration_seconds):
+    """Runs the same single-transaction load against the server with and without dynamic batching."""
+    results = []
+    for label, batch_size, delay_ms in (("no batching", 1, 0.0), ("dynamic batching", max_batch_size, max_delay_ms)):
+        sock = socket.create_server(("127.0.0.1", 0), backlog=4096)
+        port = sock.getsockname()[1]
+        context = multiprocessing.get_context("fork")
+        ready = context.Event()
+        server = context.Process(target=serve, kwargs=dict(n_workers=n_workers, max_batch_size=batch_size,
+                                                            max_delay_ms=delay_ms, sock=sock, ready_event=ready))
+        server.start()
+        ready.wait(120)
+        try:
+            latencies = np.array(asyncio.run(_load("127.0.0.1", port, concurrency, duration_seconds))) * 1000
+        finally:
+            server.terminate()
+            server.join()
+            sock.close()
+        results.append({"mode": label, "max_batch_size": batch_size, "max_delay_ms": delay_ms,
+                        "requests_per_second": round(len(latencies) / duration_seconds, 1),
+                        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                        "p99_ms": round(float(np.percentile(latencies, 99)), 2)})
+
+    print(f"\n{concurrency} concurrent clients, 1 transaction per request, {n_workers} workers, {duration_seconds}s per run")
+    for result in results:
+        print("  " + ", ".join(f"{key}={value}" for key, value in result.items()))
+    speedup = results[1]["requests_per_second"] / max(results[0]["requests_per_second"], 1e-9)
+    print(f"Dynamic batching throughput: {speedup:.1f}x the non-batching baseline")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local batching server for score.py")
+    parser.add_argument("--model-dir", help="Model root in the AZUREML_MODEL_DIR layout (default: $AZUREML_MODEL_DIR)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=N_WORKERS)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-delay-ms", type=float, default=MAX_BATCH_DELAY_MS)
+    parser.add_argument("--benchmark", action="store_true", help="Compare throughput with a non-batching baseline")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent benchmark clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per benchmark run")
+    args = parser.parse_args()
+
+    if args.model_dir:
+        os.environ["AZUREML_MODEL_DIR"] = args.model_dir
+    if not os.environ.get("AZUREML_MODEL_DIR"):
+        if not args.benchmark:
+            parser.error("Pass --model-dir or set AZUREML_MODEL_DIR")
+        os.environ["AZUREML_MODEL_DIR"] = _demo_model_dir()
+        print(f"No model given; benchmarking a model trained on generated data in {os.environ['AZUREML_MODEL_DIR']}")
+
+    if args.benchmark:
+        benchmark(args.workers, args.max_batch_size, args.max_delay_ms, args.concurrency, args.duration)
+    else:
+        serve(args.host, args.port, args.workers, args.max_batch_size, args.max_delay_ms)
@@ -1,11 +1,16 @@
 # src/models/train.py
 import argparse
+import json
 import os
+import shutil
+import urllib.parse
 import pandas as pd
-from sklearn.ensemble import IsolationForest
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-import joblib # For saving the model
+from joblib import Parallel, delayed # Process pool for per-segment training
+from detectors import FEATURE_NAMES, create_detector
+from tuning import run_search
+from drift import DRIFT_BASELINE_FILENAME, build_baseline, save_baseline
 
 # Azure ML SDK imports
 from azureml.core import Workspace, Dataset, Model, Run
@@ -18,6 +23,20 @@ PROCESSED_BLOB_CONTAINER_NAME = os.environ.get("PROCESSED_BLOB_CONTAINER_NAME",
 PROCESSED_STORAGE_ACCOUNT_NAME = os.environ.get("PROCESSED_STORAGE_ACCOUNT_NAME", "mlopsanomalyprocessedlake") # From Terraform output
 # --- End Configuration ---
 
+# --- Segment Model Configuration ---
+SEGMENT_MODEL_NAME = os.environ.get("SEGMENT_MODEL_NAME", "anomaly-segment-models") # Registered alongside the global model
+SEGMENT_MANIFEST_FILENAME = "manifest.json" # Must match score.py
+MIN_SEGMENT_ROWS = 500 # Segments with fewer rows are served by the global model
+# --- End Segment Model Configuration ---
+
+# --- Function Fallback Model Configuration ---
+FALLBACK_MODEL_NAME = os.environ.get("FALLBACK_MODEL_NAME", "anomaly-fallback-model") # Scored locally by the Azure Function when the endpoint is slow
+FALLBACK_MODEL_FILENAME = "fallback_model.npz" # Must match the Function's FALLBACK_MODEL_PATH default
+FALLBACK_N_ESTIMATORS = 25 # Small forest: cheap to score in the Function, and plain numpy arrays
+# --- End Function Fallback Model Configuration ---
+
+DRIFT_BASELINE_MODEL_NAME = os.environ.get("DRIFT_BASELINE_MODEL_NAME", "anomaly-drift-baseline") # Histograms the Azure Function monitors drift against
+
 # --- Anomaly Detection Threshold (example) ---
 # For IsolationForest, a low score indicates an anomaly. This threshold might need tuning.
 ANOMALY_SCORE_THRESHOLD = 0.05 # Lower score = higher anomaly likelihood
@@ -29,28 +48,110 @@ def get_dataset(ws, storage_account_name, container_name, path=""):
     tab_ds = Dataset.Tabular.from_parquet_files(path=data_path)
     return tab_ds.to_pandas_dataframe()
 
-def train_model(df):
-    # Features for Isolation Forest (basic set, expand as needed)
+def train_model(df, detector_type="isolation_forest", detector_params=None):
+    # Features for the detector (basic set, expand as needed)
     # Assuming df has 'amount', 'transaction_hour'
-    features = ['amount', 'transaction_hour']
-    X = df[features]
+    X = df[FEATURE_NAMES]
 
-    # Initialize and train Isolation Forest model
+    # Initialize and train the detector (IsolationForest by default, see detectors.py)
     # contamination: proportion of outliers in the data set (estimate)
     # A higher contamination value will result in more anomalies being detected.
     # For real fraud, this is often a very small number (e.g., 0.001)
-    model = IsolationForest(contamination=0.01, random_state=42, n_estimators=100) # 1% assumed contamination
+    # detector_params (e.g. from a hyperparameter search) override the defaults
+    params = dict({"contamination": 0.01}, **(detector_params or {})) # 1% assumed contamination
+    model = create_detector(detector_type, **params)
     model.fit(X)
+    if not model.ready:
+        # A model that cannot score yet would fail every request it is served for
+        raise ValueError(f"{detector_type} needs at least {model.min_training_rows} rows to train, got {len(X)}.")
     return model
 
+def _train_and_save_segment(segment_column, segment_value, segment_df, model_path, detector_type, detector_params):
+    # Runs in a worker process: train one segment model and write it straight to disk,
+    # so fitted models are never sent back to the parent process
+    model = train_model(segment_df, detector_type, detector_params)
+    model.serialize(model_path)
+    return segment_column, segment_value, len(segment_df)
+
+def publish_model(model_path, publish_dir, model_name, version):
+    """
+    Copies a registered model into publish_dir as <model_name>/<version>/<artifact>, the layout
+    score.py polls through MODEL_WATCH_DIR. The copy is staged under a hidden name and renamed
+    into place, so a watcher never loads a half-written artifact.
+    """
+    model_dir = os.path.join(publish_dir, model_name)
+    os.makedirs(model_dir, exist_ok=True)
+    staging_dir = os.path.join(model_dir, f".{version}.tmp")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    shutil.copy2(model_path, staging_dir)
+    version_dir = os.path.join(model_dir, str(version))
+    os.rename(staging_dir, version_dir)
+    return version_dir
+
+def train_segment_models(df, segment_columns, output_dir, min_rows=MIN_SEGMENT_ROWS, n_jobs=-1,
+                         detector_type="isolation_forest", detector_params=None):
+    """
+    Trains one model per segment value (e.g. per merchant_id) in parallel across processes.
+
+    Models are written to <output_dir>/<segment_column>/<segment_value>.joblib and indexed
+    in a manifest that score.py uses to load segment models lazily.
+    """
+    features = FEATURE_NAMES
+    # Segments too small for the detector to be ready (one full window for Half-Space Trees) stay on the global model
+    min_rows = max(min_rows, create_detector(detector_type, **(detector_params or {})).min_training_rows)
+    tasks = []
+    for segment_column in segment_columns:
+        os.makedirs(os.path.join(output_dir, segment_column), exist_ok=True)
+        segment_sizes = df[segment_column].value_counts()
+        eligible_values = segment_sizes[segment_sizes >= min_rows].index
+        print(f"{segment_column}: {len(eligible_values)} of {len(segment_sizes)} segments have >= {min_rows} rows")
+
+        eligible_df = df[df[segment_column].isin(eligible_values)]
+        for segment_value, segment_df in eligible_df.groupby(segment_column)[features]:
+            filename = urllib.parse.quote(str(segment_value), safe="") + ".joblib"
+            tasks.append((segment_column, str(segment_value), segment_df, os.path.join(output_dir, segment_column, filename)))
+
+    results = Parallel(n_jobs=n_jobs)(delayed(_train_and_save_segment)(*task, detector_type, detector_params) for task in tasks)
+
+    manifest = {"features": features, "segment_columns": list(segment_columns), "segments": {c: {} for c in segment_columns}}
+    for (segment_column, segment_value, n_rows), task in zip(results, tasks):
+        manifest["segments"][segment_column][segment_value] = {
+            "path": os.path.relpath(task[3], output_dir),
+            "n_rows": n_rows
+        }
+    with open(os.path.join(output_dir, SEGMENT_MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f)
+
+    print(f"Trained {len(tasks)} segment models into {output_dir}")
+    return manifest
+
+def search_hyperparameters(df, run, search="grid", n_iter=20, n_jobs=-1):
+    """Runs a parallel IsolationForest hyperparameter search (see tuning.py) and logs every candidate to the run."""
+    df = df.dropna(subset=['is_fraud'])
+    results_df, best_params = run_search(df[FEATURE_NAMES].to_numpy(), df['is_fraud'].astype(int).to_numpy(),
+                                         search=search, n_iter=n_iter, n_jobs=n_jobs)
+    print(f"Evaluated {len(results_df)} candidates. Top 5:")
+    print(results_df.head(5).round(4).to_string())
+
+    # Repeated run.log calls with the same name are charted as a series in the AML run
+    for _, row in results_df.iterrows():
+        run.log("search_candidate", f"n_estimators={row['n_estimators']}, max_samples={row['max_samples']}, "
+                                    f"max_features={row['max_features']}, contamination={row['contamination']}")
+        for metric in ["f1", "precision", "recall", "roc_auc"]:
+            run.log(f"search_{metric}", row[metric])
+    for name, value in best_params.items():
+        run.log(f"best_{name}", value)
+    return best_params
+
 def evaluate_model(model, df, run):
     # Predict raw anomaly scores (lower is more anomalous)
-    df['anomaly_score'] = model.decision_function(df[['amount', 'transaction_hour']])
+    df['anomaly_score'] = model.score_batch(df[FEATURE_NAMES])
 
     # For evaluation, we assume 'is_fraud' provides true labels for anomalies
     # In unsupervised anomaly detection, you typically rely on clustering/profiling
     # For this project, 'is_fraud' provides a ground truth for basic evaluation.
-    df['prediction'] = (df['anomaly_score'] < 0).astype(int) # IsolationForest scores <0 usually anomalies
+    df['prediction'] = (df['anomaly_score'] < 0).astype(int) # Detector scores <0 are anomalies
 
     # Filter to where 'is_fraud' is true for more relevant metrics if dataset is imbalanced
     # Or, focus on precision/recall for the positive class (anomalies)
@@ -76,6 +177,20 @@ def evaluate_model(model, df, run):
     run.log("anomaly_score_threshold", ANOMALY_SCORE_THRESHOLD)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segment-columns", default=os.environ.get("SEGMENT_COLUMNS", ""),
+                        help="Comma-separated columns to train per-segment models for, e.g. merchant_id,device_type")
+    parser.add_argument("--min-segment-rows", type=int, default=MIN_SEGMENT_ROWS)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Worker processes for segment training (-1 = all cores)")
+    parser.add_argument("--detector", default=os.environ.get("DETECTOR_TYPE", "isolation_forest"),
+                        help="Detector to train: isolation_forest or half_space_trees")
+    parser.add_argument("--search", choices=["grid", "random"], default=os.environ.get("HYPERPARAMETER_SEARCH") or None,
+                        help="Tune IsolationForest hyperparameters before training the registered model")
+    parser.add_argument("--search-iterations", type=int, default=20, help="Candidates sampled by a random search")
+    parser.add_argument("--publish-dir", default=os.environ.get("MODEL_PUBLISH_DIR") or None,
+                        help="Mounted storage path the endpoint watches (its MODEL_WATCH_DIR) to hot-swap in the new version")
+    args = parser.parse_args()
+
     print("Starting model training script...")
 
     # Get current run context
@@ -97,9 +212,18 @@ if __name__ == "__main__":
 
     print(f"Loaded {len(df_processed)} rows for training.")
 
+    # Optionally search hyperparameters first; the best candidate is the one trained and registered
+    detector_params = {}
+    if args.search:
+        if args.detector != "isolation_forest":
+            raise ValueError("Hyperparameter search is only supported for the isolation_forest detector.")
+        print(f"Running {args.search} hyperparameter search...")
+        detector_params = search_hyperparameters(df_processed, run, args.search, args.search_iterations, args.n_jobs)
+        print(f"Best hyperparameters: {detector_params}")
+
     # Train model
-    print("Training IsolationForest model...")
-    model = train_model(df_processed)
+    print(f"Training {args.detector} model...")
+    model = train_model(df_processed, args.detector, detector_params)
     print("Model training complete.")
 
     # Evaluate model
@@ -107,8 +231,8 @@ if __name__ == "__main__":
     evaluate_model(model, df_processed.copy(), run) # Use a copy to avoid modifying original df for evaluation
 
     # Save model locally
-    model_filename = "anomaly_isolation_forest_model.joblib"
-    joblib.dump(model, model_filename)
+    model_filename = f"anomaly_{args.detector}_model.joblib"
+    model.serialize(model_filename)
     print(f"Model saved locally as {model_filename}")
 
     # Register model in Azure ML Model Registry
@@ -117,12 +241,65 @@ if __name__ == "__main__":
         workspace=ws,
         model_path=model_filename, # Path to the saved model file
         model_name="anomaly-detection-model",
-        description="Isolation Forest model for transaction anomaly detection",
-        tags={"model_type": "anomaly_detection", "algorithm": "IsolationForest"},
+        description=f"{args.detector} model for transaction anomaly detection",
+        tags=dict({"model_type": "anomaly_detection", "algorithm": args.detector},
+                  **{name: str(value) for name, value in detector_params.items()}), # Tuned hyperparameters, if any
         properties={"accuracy": run.get_metrics().get("accuracy"), # Access metrics from the run
                     "precision": run.get_metrics().get("precision")}
     )
     print(f"Model registered with ID: {registered_model.id}, Version: {registered_model.version}")
 
+    if args.publish_dir:
+        published_dir = publish_model(model_filename, args.publish_dir, registered_model.name, registered_model.version)
+        print(f"Model published for hot-swap to {published_dir}")
+
+    # Save the training distributions next to the model and register them for the Azure Function's drift monitor
+    print("Building drift baseline...")
+    baseline = build_baseline(df_processed, model.score_batch(df_processed[FEATURE_NAMES]),
+                              model_version=str(registered_model.version))
+    save_baseline(baseline, DRIFT_BASELINE_FILENAME)
+    registered_baseline = Model.register(
+        workspace=ws,
+        model_path=DRIFT_BASELINE_FILENAME,
+        model_name=DRIFT_BASELINE_MODEL_NAME,
+        description="Training histograms of amount, transaction_hour and anomaly_score for drift monitoring",
+        tags={"model_name": "anomaly-detection-model", "model_version": str(registered_model.version)}
+    )
+    print(f"Drift baseline registered with ID: {registered_baseline.id}, Version: {registered_baseline.version}")
+
+    # Train a lightweight IsolationForest for the Azure Function to score locally when the endpoint misses its deadline
+    print("Training fallback model for the Azure Function...")
+    fallback_model = train_model(df_processed, "isolation_forest", dict(detector_params, n_estimators=FALLBACK_N_ESTIMATORS))
+    fallback_model.export_compact(FALLBACK_MODEL_FILENAME)
+    registered_fallback = Model.register(
+        workspace=ws,
+        model_path=FALLBACK_MODEL_FILENAME,
+        model_name=FALLBACK_MODEL_NAME,
+        description=f"{FALLBACK_N_ESTIMATORS}-tree IsolationForest as numpy arrays, for local fallback scoring in the Azure Function",
+        tags={"model_name": "anomaly-detection-model", "model_version": str(registered_model.version)}
+    )
+    print(f"Fallback model registered with ID: {registered_fallback.id}, Version: {registered_fallback.version}")
+
+    # Optionally train and register per-segment models as one directory artifact
+    segment_columns = [c.strip() for c in args.segment_columns.split(",") if c.strip()]
+    if segment_columns:
+        print(f"Training per-segment models for: {segment_columns}")
+        segment_model_dir = "segment_models"
+        manifest = train_segment_models(df_processed, segment_columns, segment_model_dir,
+                                        min_rows=args.min_segment_rows, n_jobs=args.n_jobs,
+                                        detector_type=args.detector, detector_params=detector_params)
+        n_segment_models = sum(len(values) for values in manifest["segments"].values())
+        run.log("segment_models", n_segment_models)
+
+        registered_segment_models = Model.register(
+            workspace=ws,
+            model_path=segment_model_dir, # Whole directory: manifest plus one file per segment
+            model_name=SEGMENT_MODEL_NAME,
+            description=f"Per-segment {args.detector} models for transaction anomaly detection",
+            tags={"model_type": "anomaly_detection", "algorithm": args.detector,
+                  "segment_columns": ",".join(segment_columns)}
+        )
+        print(f"Segment models registered with ID: {registered_segment_models.id}, Version: {registered_segment_models.version}")
+
     # Signal completion
     run.complete()
\ No newline at end of file
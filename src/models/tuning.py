@@ -0,0 +1,174 @@
+# src/models/tuning.py
+# Hyperparameter search for the IsolationForest detector.
+#
+# Candidates are evaluated in a process pool. The training and validation matrices are
+# placed in shared memory once and every worker maps them read-only, so no candidate
+# reloads or copies the data. Within a worker, n_estimators is grown with warm_start
+# (each size only fits the extra trees) and contamination is applied by recomputing the
+# threshold offset, which does not need a refit.
+#
+# Usage:
+#   python tuning.py --input processed.parquet [--search random --n-iter 20]
+import argparse
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.metrics import precision_score, recall_score, f1_score, roc_auc_score
+
+from detectors import FEATURE_NAMES
+
+# --- Search Configuration ---
+SEARCH_SPACE = {
+    "n_estimators": [50, 100, 200, 400], # Grown with warm_start, smallest first
+    "max_samples": ["auto", 512, 2048, 8192],
+    "max_features": [0.5, 1.0],
+    "contamination": [0.002, 0.005, 0.01, 0.02, 0.05]
+}
+SEARCH_METRIC = "f1" # Validation metric used to pick the best candidate
+VALIDATION_FRACTION = 0.3 # Share of rows held out for scoring candidates
+# --- End Search Configuration ---
+
+# Shared-memory views, set once per worker process by _attach_shared_arrays
+_shared = {}
+
+def _share_array(array):
+    """Copies an array into a new shared memory block. Returns the block and the spec workers use to map it."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+def _attach_shared_arrays(specs):
+    # Pool initializer: map every shared block as a read-only array (no copy)
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = False
+        _shared[key] = view
+        _shared[key + "_block"] = block # Keep the mapping alive for the worker's lifetime
+
+def _validation_metrics(y_true, scores):
+    y_pred = (scores < 0).astype(int)
+    return {
+        "precision": precision_score(y_true, y_pred, zero_division=0),
+        "recall": recall_score(y_true, y_pred, zero_division=0),
+        "f1": f1_score(y_true, y_pred, zero_division=0),
+        "roc_auc": roc_auc_score(y_true, -scores) if 0 < y_true.sum() < len(y_true) else float("nan")
+    }
+
+def _evaluate_group(max_samples, max_features, n_estimators_values, contamination_values, random_state):
+    """
+    Runs in a worker process. Grows one forest through the requested n_estimators sizes and
+    evaluates every contamination value at each size. Returns one result dict per candidate.
+    """
+    X_train, X_val, y_val = _shared["X_train"], _shared["X_val"], _shared["y_val"]
+    model = IsolationForest(max_samples=max_samples, max_features=max_features,
+                            random_state=random_state, warm_start=True, n_jobs=1)
+    results = []
+    fit_seconds = 0.0
+    for n_estimators in sorted(n_estimators_values):
+        start = time.perf_counter()
+        model.set_params(n_estimators=n_estimators)
+        model.fit(X_train) # Only the trees beyond the previous size are fitted
+        fit_seconds += time.perf_counter() - start
+
+        # Contamination only moves the threshold, exactly as IsolationForest.fit sets offset_
+        train_scores = model.score_samples(X_train)
+        val_scores = model.score_samples(X_val)
+        for contamination in contamination_values:
+            offset = np.percentile(train_scores, 100.0 * contamination)
+            results.append(dict(
+                _validation_metrics(y_val, val_scores - offset),
+                n_estimators=n_estimators, max_samples=max_samples, max_features=max_features,
+                contamination=contamination, fit_seconds=fit_seconds
+            ))
+    return results
+
+def candidate_groups(search="grid", n_iter=20, search_space=SEARCH_SPACE, random_state=42):
+    """
+    Lists the candidates to evaluate, grouped by the parameters that need their own forest.
+    Returns {(max_samples, max_features): (sorted n_estimators values, sorted contamination values)}.
+
+    A random search samples n_iter candidates from the grid. Candidates that share a forest
+    are still evaluated together, so sampling does not repeat any fits.
+    """
+    grid = list(itertools.product(search_space["n_estimators"], search_space["max_samples"],
+                                  search_space["max_features"], search_space["contamination"]))
+    if search == "random":
+        grid = random.Random(random_state).sample(grid, min(n_iter, len(grid)))
+    elif search != "grid":
+        raise ValueError(f"Unknown search '{search}'. Use 'grid' or 'random'.")
+
+    groups = {}
+    for n_estimators, max_samples, max_features, contamination in grid:
+        n_estimators_values, contamination_values = groups.setdefault((max_samples, max_features), (set(), set()))
+        n_estimators_values.add(n_estimators)
+        contamination_values.add(contamination)
+    return {key: (sorted(n), sorted(c)) for key, (n, c) in groups.items()}
+
+def run_search(X, y, search="grid", n_iter=20, n_jobs=-1, metric=SEARCH_METRIC,
+               validation_fraction=VALIDATION_FRACTION, search_space=SEARCH_SPACE, random_state=42):
+    """
+    Evaluates IsolationForest hyperparameters against is_fraud labels on a held-out split.
+
+    Returns a DataFrame with one row per evaluated candidate, best first, and the best
+    candidate's parameters as a dict ready for create_detector("isolation_forest", **params).
+    A random search can evaluate a few more candidates than n_iter, because every
+    contamination value is free once a forest is fitted.
+    """
+    # IsolationForest validates input to float32; casting once here lets workers fit and score the shared arrays without copying them
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.int8)
+    order = np.random.RandomState(random_state).permutation(len(X))
+    n_val = int(len(X) * validation_fraction)
+    arrays = {"X_train": X[order[n_val:]], "X_val": X[order[:n_val]], "y_val": y[order[:n_val]]}
+
+    groups = candidate_groups(search, n_iter, search_space, random_state)
+    max_workers = min(len(groups), os.cpu_count() if n_jobs == -1 else n_jobs)
+
+    blocks, specs = [], {}
+    try:
+        for key, array in arrays.items():
+            block, specs[key] = _share_array(array)
+            blocks.append(block)
+        del arrays # The parent's copies are no longer needed
+
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_shared_arrays, initargs=(specs,)) as pool:
+            futures = [pool.submit(_evaluate_group, max_samples, max_features, n_values, c_values, random_state)
+                       for (max_samples, max_features), (n_values, c_values) in groups.items()]
+            results = [row for future in futures for row in future.result()]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results_df = pd.DataFrame(results).sort_values(metric, ascending=False).reset_index(drop=True)
+    best = results_df.iloc[0]
+    best_params = {
+        "n_estimators": int(best["n_estimators"]),
+        "max_samples": best["max_samples"] if best["max_samples"] == "auto" else int(best["max_samples"]),
+        "max_features": float(best["max_features"]),
+        "contamination": float(best["contamination"])
+    }
+    return results_df, best_params
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search IsolationForest hyperparameters on labelled transactions")
+    parser.add_argument("--input", required=True, help="CSV or Parquet with amount, transaction_hour and is_fraud columns")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--n-iter", type=int, default=20, help="Candidates sampled by a random search")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Worker processes (-1 = all cores)")
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.input) if args.input.endswith(".parquet") else pd.read_csv(args.input)
+    df = df.dropna(subset=FEATURE_NAMES + ["is_fraud"])
+    start = time.perf_counter()
+    results_df, best_params = run_search(df[FEATURE_NAMES].to_numpy(), df["is_fraud"].astype(int).to_numpy(),
+                                         search=args.search, n_iter=args.n_iter, n_jobs=args.n_jobs)
+    print(results_df.head(10).round(4).to_string())
+    print(f"Evaluated {len(results_df)} candidates in {time.perf_counter() - start:.1f}s. Best: {best_params}")
@@ -3,15 +3,21 @@ import pandas as pd
 import numpy as np
 import json
 import datetime
-import random
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.ensemble import IsolationForest
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 import joblib
 import io
 import base64
+import os
+import tempfile
+import hashlib
+import weakref
+import sklearn
+import time
+from data.data_generator import generate_transaction_data
+from src.models.detectors import FEATURE_NAMES, IsolationForestDetector, HalfSpaceTreesDetector, format_explanations
 
 # Page configuration
 st.set_page_config(
@@ -53,135 +59,938 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def generate_synthetic_data(n_samples=1000):
+# cache_resource hands every session the same frame instead of unpickling a copy per
+# call; callers must treat it as read-only (derive new frames, never assign into it)
+@st.cache_resource(max_entries=4)
+def generate_synthetic_data(n_samples=1000, seed=42):
     """Generate synthetic transaction data for demonstration"""
-    np.random.seed(42)
+    # A local generator keeps concurrent sessions from sharing global random state
+    rng = np.random.RandomState(seed)
     
     # Generate normal transactions
-    normal_amounts = np.random.normal(100, 50, int(n_samples * 0.95))
-    normal_hours = np.random.randint(0, 24, int(n_samples * 0.95))
+    normal_amounts = rng.normal(100, 50, int(n_samples * 0.95))
+    normal_hours = rng.randint(0, 24, int(n_samples * 0.95))
     
     # Generate anomalous transactions
-    anomaly_amounts = np.random.normal(5000, 2000, int(n_samples * 0.05))
-    anomaly_hours = np.random.choice([0, 1, 2, 3, 22, 23], int(n_samples * 0.05))  # Unusual hours
+    anomaly_amounts = rng.normal(5000, 2000, int(n_samples * 0.05))
+    anomaly_hours = rng.choice([0, 1, 2, 3, 22, 23], int(n_samples * 0.05))  # Unusual hours
     
     # Combine data
     amounts = np.concatenate([normal_amounts, anomaly_amounts])
     hours = np.concatenate([normal_hours, anomaly_hours])
+    n_rows = len(amounts)
     
-    # Create DataFrame
-    data = []
-    for i in range(len(amounts)):
-        transaction_id = f"TXN{str(i).zfill(6)}"
-        user_id = f"USER{random.randint(1000, 5000)}"
-        timestamp = datetime.datetime.now() - datetime.timedelta(hours=random.randint(0, 24*7))
-        
+    # Build columns with vectorized operations so millions of rows stay fast
+    ip_octets = [pd.Series(rng.randint(1, 255, n_rows)).astype(str) for _ in range(4)]
+    
+    return pd.DataFrame({
+        'transaction_id': 'TXN' + pd.Series(np.arange(n_rows)).astype(str).str.zfill(6),
+        'user_id': 'USER' + pd.Series(rng.randint(1000, 5001, n_rows)).astype(str),
+        'amount': np.round(amounts, 2),
+        'transaction_hour': hours,
+        'timestamp': pd.Timestamp.now() - pd.to_timedelta(rng.randint(0, 24*7 + 1, n_rows), unit='h'),
         # Determine if this is actually an anomaly based on amount and hour
-        is_anomaly = amounts[i] > 1000 or hours[i] in [0, 1, 2, 3, 22, 23]
-        
-        data.append({
-            'transaction_id': transaction_id,
-            'user_id': user_id,
-            'amount': round(amounts[i], 2),
-            'transaction_hour': hours[i],
-            'timestamp': timestamp,
-            'is_anomaly': is_anomaly,
-            'ip_address': f"{random.randint(1,254)}.{random.randint(1,254)}.{random.randint(1,254)}.{random.randint(1,254)}",
-            'device_type': random.choice(["mobile", "desktop", "tablet"]),
-            'merchant_id': str(random.randint(1, 100))
-        })
-    
-    return pd.DataFrame(data)
-
-@st.cache_resource
-def train_anomaly_model(data):
+        'is_anomaly': (amounts > 1000) | np.isin(hours, [0, 1, 2, 3, 22, 23]),
+        'ip_address': ip_octets[0] + '.' + ip_octets[1] + '.' + ip_octets[2] + '.' + ip_octets[3],
+        'device_type': rng.choice(["mobile", "desktop", "tablet"], n_rows),
+        'merchant_id': pd.Series(rng.randint(1, 101, n_rows)).astype(str)
+    })
+
+# Persistent model cache: trained models survive restarts and are shared by every session
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", ".model_cache")
+MODEL_CACHE_MAX_ENTRIES = int(os.environ.get("MODEL_CACHE_MAX_ENTRIES", "20"))
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("MODEL_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def train_anomaly_model(data, contamination=0.05, n_estimators=100, random_state=42):
     """Train Isolation Forest model for anomaly detection"""
     # Prepare features
-    features = ['amount', 'transaction_hour']
+    features = FEATURE_NAMES
     X = data[features]
     
-    # Train model
-    model = IsolationForest(
-        contamination=0.05,  # 5% contamination
-        random_state=42,
-        n_estimators=100
+    # Train model (shared detector interface, see src/models/detectors.py)
+    model = IsolationForestDetector(
+        contamination=contamination,  # 5% contamination by default
+        random_state=random_state,
+        n_estimators=n_estimators
     )
     model.fit(X)
     
     return model, features
 
+def model_cache_key(**params):
+    """Build a short cache key from the parameters that determine a trained model"""
+    # Include the sklearn version: pickled models are not portable across versions
+    key_params = dict(params, sklearn_version=sklearn.__version__)
+    return hashlib.sha256(json.dumps(key_params, sort_keys=True).encode()).hexdigest()[:32]
+
+def load_cached_model(key, cache_dir=MODEL_CACHE_DIR):
+    """Load a model from the on-disk cache, or return None on a miss"""
+    path = os.path.join(cache_dir, f"{key}.joblib")
+    try:
+        cached = joblib.load(path)
+    except Exception:
+        return None  # Missing or unreadable entries are treated as misses
+    try:
+        os.utime(path)  # Mark as recently used for LRU eviction
+    except OSError:
+        pass  # Evicted by another session since it was loaded; the loaded model is still valid
+    return cached
+
+def save_cached_model(key, value, cache_dir=MODEL_CACHE_DIR,
+                      max_entries=MODEL_CACHE_MAX_ENTRIES, max_bytes=MODEL_CACHE_MAX_BYTES):
+    """Store a model in the on-disk cache, then evict least recently used entries"""
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file and rename it, so other sessions never read a partial model
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(tmp_fd)
+    try:
+        joblib.dump(value, tmp_path)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{key}.joblib"))
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    evict_model_cache(cache_dir, max_entries, max_bytes)
+
+def evict_model_cache(cache_dir=MODEL_CACHE_DIR, max_entries=MODEL_CACHE_MAX_ENTRIES, max_bytes=MODEL_CACHE_MAX_BYTES):
+    """Remove least recently used cache entries until the count and size limits hold"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".joblib"):
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                continue  # Removed by another session
+            entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort(reverse=True)  # Most recently used first
+    
+    total_bytes = 0
+    for index, (_, size, name) in enumerate(entries):
+        total_bytes += size
+        if index >= max_entries or (index > 0 and total_bytes > max_bytes):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_anomaly_model(n_samples, seed, contamination, n_estimators):
+    """Return a trained model for the given data and model parameters.
+
+    Keyed on small parameters only, so a warm lookup never hashes the dataset.
+    Misses fall through to the on-disk cache before training.
+    """
+    key = model_cache_key(detector=IsolationForestDetector.detector_type, n_samples=n_samples, seed=seed,
+                          contamination=contamination, n_estimators=n_estimators)
+    cached = load_cached_model(key)
+    if cached is not None:
+        return cached
+    
+    data = generate_synthetic_data(n_samples, seed)
+    model, features = train_anomaly_model(data, contamination=contamination, n_estimators=n_estimators)
+    try:
+        save_cached_model(key, (model, features))
+    except OSError as e:
+        st.warning(f"Could not write model cache: {e}")
+    return model, features
+
 def predict_anomaly(model, features, transaction_data):
     """Predict anomaly for given transaction data"""
     # Prepare input data
     input_df = pd.DataFrame([transaction_data])
     X_input = input_df[features]
     
-    # Get anomaly score (lower = more anomalous)
-    anomaly_score = model.decision_function(X_input)[0]
+    # Get anomaly score (lower = more anomalous), with per-feature explanations when the model supports them
+    explanation = None
+    if model.supports_explanations:
+        scores, explanations = model.score_and_explain(X_input)
+        explanation = format_explanations(explanations, features)[0]
+    else:
+        scores = model.score_batch(X_input)
+    anomaly_score = scores[0]
     is_anomaly = anomaly_score < 0
     
     return {
         'anomaly_score': anomaly_score,
         'is_anomaly': is_anomaly,
-        'confidence': abs(anomaly_score)
+        'confidence': abs(anomaly_score),
+        'explanation': explanation
+    }
+
+# Batch scoring settings: rows per chunk and how much of the result is kept in memory for display
+BATCH_CHUNK_SIZE = 100_000
+BATCH_TOP_ANOMALIES = 1000
+BATCH_PAGE_SIZE = 100
+
+def score_csv_in_chunks(model, features, source, output_path, chunksize=BATCH_CHUNK_SIZE,
+                        top_n=BATCH_TOP_ANOMALIES, page_size=BATCH_PAGE_SIZE, progress_callback=None):
+    """Score a CSV chunk by chunk, appending results to output_path.
+
+    Only a running summary, the top_n most anomalous rows and the byte offset of
+    every page_size-row page are kept in memory, so memory use is bounded by the
+    chunk size rather than the file size.
+    """
+    total_rows = 0
+    anomaly_count = 0
+    top_anomalies = None
+    columns = None
+    page_offsets = []
+    total_bytes = getattr(source, 'size', None)
+
+    with open(output_path, 'wb') as output_file:
+        for chunk_index, chunk in enumerate(pd.read_csv(source, chunksize=chunksize)):
+            if chunk_index == 0 and not all(feature in chunk.columns for feature in features):
+                raise ValueError(f"CSV must contain columns: {features}")
+
+            anomaly_scores = model.score_batch(chunk[features])
+            chunk['anomaly_score'] = anomaly_scores
+            chunk['is_anomaly'] = anomaly_scores < 0
+
+            if columns is None:
+                columns = list(chunk.columns)
+                output_file.write(chunk.iloc[:0].to_csv(index=False).encode('utf-8'))
+
+            # Written one page at a time so each page's start offset is known for paging
+            position = 0
+            while position < len(chunk):
+                row = total_rows + position
+                if row % page_size == 0:
+                    page_offsets.append(output_file.tell())
+                end = min(len(chunk), position + page_size - row % page_size)
+                output_file.write(chunk.iloc[position:end].to_csv(header=False, index=False).encode('utf-8'))
+                position = end
+
+            total_rows += len(chunk)
+            anomaly_count += int(chunk['is_anomaly'].sum())
+
+            # Keep a bounded set of the most anomalous rows seen so far (lowest scores first)
+            chunk_anomalies = chunk[chunk['is_anomaly']].nsmallest(top_n, 'anomaly_score')
+            if top_anomalies is None:
+                top_anomalies = chunk_anomalies
+            else:
+                top_anomalies = pd.concat([top_anomalies, chunk_anomalies]).nsmallest(top_n, 'anomaly_score')
+
+            if progress_callback is not None:
+                if total_bytes:
+                    progress_callback(min(source.tell() / total_bytes, 1.0), total_rows)
+                else:
+                    progress_callback(None, total_rows)
+
+    if top_anomalies is None:
+        raise ValueError("CSV file contains no rows")
+
+    return {
+        'total_rows': total_rows,
+        'anomaly_count': anomaly_count,
+        'top_anomalies': top_anomalies.reset_index(drop=True),
+        'output_path': output_path,
+        'columns': columns,
+        'page_size': page_size,
+        'page_offsets': np.array(page_offsets, dtype=np.int64)
     }
 
-def create_visualizations(data, model, features):
-    """Create various visualizations for the data and model"""
+def read_result_page(batch_result, page):
+    """Read a single page of a scored result file, seeking straight to its recorded offset."""
+    with open(batch_result['output_path'], 'rb') as results_file:
+        results_file.seek(int(batch_result['page_offsets'][page]))
+        return pd.read_csv(results_file, header=None, names=batch_result['columns'],
+                           nrows=batch_result['page_size'])
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class ResultFile:
+    """A scored result file on disk, deleted once nothing refers to it.
+
+    It is kept in session state, so the file goes away when it is replaced, when the
+    session ends and its state is garbage collected, or at interpreter exit at the latest.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._finalizer = weakref.finalize(self, _remove_file, path)
+
+    def discard(self):
+        self._finalizer()
+
+def discard_batch_result():
+    """Delete the previous upload's result file and forget it."""
+    batch_result = st.session_state.pop('batch_result', None)
+    if batch_result is not None:
+        batch_result['result_file'].discard()
+
+# Chart settings: the browser only ever receives binned aggregates and a bounded point sample
+SAMPLE_SIZE_OPTIONS = [100, 500, 1000, 5000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 2_000_000]
+CHART_AMOUNT_BINS = 50
+CHART_DENSITY_AMOUNT_BINS = 60
+CHART_NORMAL_SAMPLE_SIZE = 5000
+CHART_MAX_ANOMALY_POINTS = 20_000
+
+@st.cache_data(show_spinner=False)
+def compute_chart_aggregates(_data, _model, features, cache_key):
+    """Aggregate the dataset on the server so charts do not depend on the row count.
+
+    The leading underscore keeps Streamlit from hashing the frame and model;
+    cache_key identifies the dataset and model parameters instead.
+    """
+    amounts = _data['amount'].to_numpy()
+    hours = _data['transaction_hour'].to_numpy()
     
-    # 1. Amount vs Hour scatter plot
-    fig_scatter = px.scatter(
-        data, 
-        x='transaction_hour', 
-        y='amount',
-        color='is_anomaly',
+    # 2D binned density of amount against hour (one column per hour)
+    density, _, amount_edges = np.histogram2d(
+        hours, amounts,
+        bins=[np.arange(25), np.linspace(amounts.min(), amounts.max(), CHART_DENSITY_AMOUNT_BINS + 1)]
+    )
+    
+    # Precomputed 1D distributions
+    amount_counts, amount_hist_edges = np.histogram(amounts, bins=CHART_AMOUNT_BINS)
+    hour_counts = np.bincount(hours, minlength=24)
+    
+    # Model predictions over the full dataset, computed once per dataset
+    predicted_anomaly = _model.predict_batch(_data[features])
+    
+    # Points to draw: every flagged transaction plus a stratified (by hour) sample of normal ones
+    flagged = _data['is_anomaly'].to_numpy() | predicted_anomaly
+    point_columns = ['transaction_hour', 'amount', 'is_anomaly']
+    anomaly_points = _data.loc[flagged, point_columns].assign(model_prediction=predicted_anomaly[flagged])
+    if len(anomaly_points) > CHART_MAX_ANOMALY_POINTS:
+        anomaly_points = anomaly_points.sample(CHART_MAX_ANOMALY_POINTS, random_state=42)
+    
+    normal_points = _data.loc[~flagged, point_columns].assign(model_prediction=False)
+    if len(normal_points) > CHART_NORMAL_SAMPLE_SIZE:
+        normal_points = normal_points.groupby('transaction_hour', group_keys=False).sample(
+            frac=CHART_NORMAL_SAMPLE_SIZE / len(normal_points), random_state=42
+        )
+    
+    return {
+        'n_rows': len(_data),
+        'density': density.T,  # rows = amount bins, columns = hours
+        'density_amount_centers': (amount_edges[:-1] + amount_edges[1:]) / 2,
+        'amount_counts': amount_counts,
+        'amount_bin_centers': (amount_hist_edges[:-1] + amount_hist_edges[1:]) / 2,
+        'amount_bin_width': amount_hist_edges[1] - amount_hist_edges[0],
+        'hour_counts': hour_counts,
+        'points': pd.concat([anomaly_points, normal_points], ignore_index=True),
+        'n_anomaly_points': len(anomaly_points),
+        'n_normal_points': len(normal_points)
+    }
+
+def create_visualizations(aggregates):
+    """Create various visualizations from precomputed chart aggregates"""
+    points = aggregates['points']
+    
+    # 1. Amount vs Hour: binned density with flagged points and a sample of normal points overlaid
+    fig_scatter = go.Figure()
+    fig_scatter.add_trace(go.Heatmap(
+        x=np.arange(24),
+        y=aggregates['density_amount_centers'],
+        z=np.log1p(aggregates['density']),
+        colorscale='Blues',
+        showscale=False,
+        customdata=aggregates['density'],
+        hovertemplate='Hour %{x}<br>Amount ~$%{y:.0f}<br>Transactions: %{customdata:.0f}<extra></extra>',
+        name='Density'
+    ))
+    for is_anomaly, color, label in [(False, '#4444ff', 'Normal (sample)'), (True, '#ff4444', 'Anomaly')]:
+        subset = points[points['is_anomaly'] == is_anomaly]
+        fig_scatter.add_trace(go.Scattergl(
+            x=subset['transaction_hour'], y=subset['amount'], mode='markers',
+            marker=dict(color=color, size=4, opacity=0.6), name=label
+        ))
+    fig_scatter.update_layout(
         title='Transaction Amount vs Hour (Anomalies Highlighted)',
-        labels={'transaction_hour': 'Hour of Day', 'amount': 'Transaction Amount ($)'},
-        color_discrete_map={True: '#ff4444', False: '#4444ff'}
+        xaxis_title='Hour of Day', yaxis_title='Transaction Amount ($)', height=400
     )
-    fig_scatter.update_layout(height=400)
     
     # 2. Amount distribution
-    fig_hist = px.histogram(
-        data,
-        x='amount',
-        nbins=50,
+    fig_hist = go.Figure(go.Bar(
+        x=aggregates['amount_bin_centers'],
+        y=aggregates['amount_counts'],
+        width=aggregates['amount_bin_width']
+    ))
+    fig_hist.update_layout(
         title='Transaction Amount Distribution',
-        labels={'amount': 'Transaction Amount ($)', 'count': 'Frequency'}
+        xaxis_title='Transaction Amount ($)', yaxis_title='Frequency', bargap=0, height=400
     )
-    fig_hist.update_layout(height=400)
     
     # 3. Hour distribution
-    hour_counts = data['transaction_hour'].value_counts().reset_index()
-    hour_counts.columns = ['hour', 'count']  # Rename columns for clarity
     fig_hour = px.bar(
-        hour_counts,
-        x='hour',
-        y='count',
+        x=np.arange(24),
+        y=aggregates['hour_counts'],
         title='Transaction Volume by Hour',
-        labels={'hour': 'Hour of Day', 'count': 'Number of Transactions'}
+        labels={'x': 'Hour of Day', 'y': 'Number of Transactions'}
     )
     fig_hour.update_layout(height=400)
     
     # 4. Model predictions visualization
-    predictions = model.predict(data[features])
-    data_with_predictions = data.copy()
-    data_with_predictions['model_prediction'] = predictions == -1  # -1 means anomaly in Isolation Forest
-    
     fig_model = px.scatter(
-        data_with_predictions,
+        points,
         x='transaction_hour',
         y='amount',
         color='model_prediction',
         title='Model Predictions vs Actual Anomalies',
         labels={'transaction_hour': 'Hour of Day', 'amount': 'Transaction Amount ($)'},
-        color_discrete_map={True: '#ff4444', False: '#4444ff'}
+        color_discrete_map={True: '#ff4444', False: '#4444ff'},
+        render_mode='webgl'
     )
     fig_model.update_layout(height=400)
     
     return fig_scatter, fig_hist, fig_hour, fig_model
 
+@st.cache_data(show_spinner=False)
+def compute_performance_metrics(_data, _model, features, cache_key):
+    """Compute evaluation metrics for the model against the synthetic labels"""
+    from sklearn.metrics import confusion_matrix
+    
+    # Calculate metrics
+    y_true = _data['is_anomaly'].astype(int)
+    y_pred = _model.predict_batch(_data[features]).astype(int)
+    
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred, zero_division=0),
+        'recall': recall_score(y_true, y_pred, zero_division=0),
+        'f1': f1_score(y_true, y_pred, zero_division=0),
+        'confusion_matrix': confusion_matrix(y_true, y_pred, labels=[0, 1])
+    }
+
+@st.cache_data(show_spinner=False)
+def render_confusion_matrix(cm):
+    """Render the confusion matrix heatmap to PNG bytes"""
+    # Plotting libraries are only imported when the performance tab is first viewed
+    import seaborn as sns
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    
+    fig, ax = plt.subplots(figsize=(8, 6))
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', ax=ax)
+    ax.set_title('Confusion Matrix')
+    ax.set_xlabel('Predicted')
+    ax.set_ylabel('Actual')
+    
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+def render_data_analysis_tab(data, model, features, cache_key):
+    st.subheader("Data Analysis")
+    
+    # Create visualizations from server-side aggregates
+    aggregates = compute_chart_aggregates(data, model, features, cache_key=cache_key)
+    fig_scatter, fig_hist, fig_hour, fig_model = create_visualizations(aggregates)
+    
+    if aggregates['n_normal_points'] + aggregates['n_anomaly_points'] < aggregates['n_rows']:
+        st.caption(
+            f"Scatter plots show {aggregates['n_anomaly_points']:,} flagged transactions and a stratified sample of "
+            f"{aggregates['n_normal_points']:,} normal ones out of {aggregates['n_rows']:,}; "
+            f"density and histograms use every transaction."
+        )
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.plotly_chart(fig_scatter, use_container_width=True)
+        st.plotly_chart(fig_hist, use_container_width=True)
+    
+    with col2:
+        st.plotly_chart(fig_hour, use_container_width=True)
+        st.plotly_chart(fig_model, use_container_width=True)
+    
+    # Data table
+    st.subheader("Sample Data")
+    st.dataframe(data.head(10), use_container_width=True)
+
+@st.fragment
+def live_detection_fragment(model, features):
+    """Single-transaction detection; widget changes rerun only this fragment"""
+    st.subheader("Live Anomaly Detection")
+    st.write("Enter transaction details to detect anomalies in real-time:")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        amount = st.number_input("Transaction Amount ($)", min_value=0.01, max_value=100000.0, value=100.0, step=0.01)
+        hour = st.slider("Transaction Hour", 0, 23, 12)
+    
+    with col2:
+        user_id = st.text_input("User ID", value="USER1234")
+        device_type = st.selectbox("Device Type", ["mobile", "desktop", "tablet"])
+    
+    # Create transaction data
+    transaction_data = {
+        'amount': amount,
+        'transaction_hour': hour,
+        'user_id': user_id,
+        'device_type': device_type,
+        'timestamp': datetime.datetime.now().isoformat()
+    }
+    
+    if st.button("🔍 Detect Anomaly", type="primary"):
+        # Get prediction
+        prediction = predict_anomaly(model, features, transaction_data)
+        
+        # Display results
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("### Transaction Details")
+            st.json(transaction_data)
+        
+        with col2:
+            st.markdown("### Detection Results")
+            
+            if prediction['is_anomaly']:
+                st.markdown('<div class="anomaly-alert">🚨 ANOMALY DETECTED</div>', unsafe_allow_html=True)
+            else:
+                st.markdown('<div class="normal-alert">✅ NORMAL TRANSACTION</div>', unsafe_allow_html=True)
+            
+            st.metric("Anomaly Score", f"{prediction['anomaly_score']:.4f}")
+            st.metric("Confidence", f"{prediction['confidence']:.4f}")
+            
+            # Explanation
+            explanation = prediction['explanation']
+            if prediction['is_anomaly'] and explanation:
+                top_feature = explanation['top_feature']
+                st.info(f"Flagged mainly because of **{top_feature}**: it made "
+                        f"{explanation['isolating_share'][top_feature]:.0%} of the isolating splits across trees "
+                        f"(average path length {explanation['mean_path_length']:.1f}; shorter = more isolated).")
+            elif prediction['is_anomaly']:
+                st.info("This transaction was flagged as anomalous due to unusual patterns in amount, timing, or other features.")
+            else:
+                st.success("This transaction appears to follow normal patterns.")
+            if explanation:
+                st.markdown("**Feature contributions**")
+                st.bar_chart(pd.Series(explanation['feature_contributions'], name="contribution"))
+
+@st.fragment
+def batch_prediction_fragment(model, features):
+    """CSV batch scoring; uploads and paging rerun only this fragment"""
+    st.subheader("Batch Prediction")
+    st.write("Upload a CSV file with transaction data for batch anomaly detection:")
+    
+    uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
+    
+    if uploaded_file is not None:
+        upload_key = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}-{uploaded_file.size}"
+        batch_result = st.session_state.get('batch_result')
+        
+        # Score each upload once; page changes and other reruns reuse the result file
+        if batch_result is None or batch_result['upload_key'] != upload_key:
+            discard_batch_result()
+            
+            output_fd, output_path = tempfile.mkstemp(prefix="anomaly_results_", suffix=".csv")
+            os.close(output_fd)
+            result_file = ResultFile(output_path)
+            progress_bar = st.progress(0.0, text="Scoring transactions...")
+            
+            def update_progress(fraction, rows_done):
+                label = f"Scored {rows_done:,} transactions"
+                progress_bar.progress(fraction if fraction is not None else 0.0, text=label)
+            
+            try:
+                batch_result = score_csv_in_chunks(
+                    model, features, uploaded_file, output_path, progress_callback=update_progress
+                )
+                batch_result['upload_key'] = upload_key
+                batch_result['result_file'] = result_file
+                st.session_state['batch_result'] = batch_result
+            except Exception as e:
+                result_file.discard()
+                batch_result = None
+                st.error(f"Error processing file: {str(e)}")
+            finally:
+                progress_bar.empty()
+        
+        if batch_result is not None:
+            st.success(f"Processed {batch_result['total_rows']:,} transactions")
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Transactions Scored", f"{batch_result['total_rows']:,}")
+            with col2:
+                st.metric("Anomalies Detected", f"{batch_result['anomaly_count']:,}")
+            with col3:
+                batch_rate = batch_result['anomaly_count'] / batch_result['total_rows'] * 100
+                st.metric("Anomaly Rate", f"{batch_rate:.2f}%")
+            
+            # Anomalies first: the most anomalous rows are kept in memory for triage
+            st.markdown(f"**Top {len(batch_result['top_anomalies']):,} anomalies (most anomalous first)**")
+            st.dataframe(batch_result['top_anomalies'], use_container_width=True)
+            
+            # Full results are paged from the result file on disk
+            with st.expander("Browse all results"):
+                n_pages = max(1, -(-batch_result['total_rows'] // BATCH_PAGE_SIZE))
+                page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
+                st.caption(f"Page {page} of {n_pages:,}")
+                st.dataframe(read_result_page(batch_result, page - 1), use_container_width=True)
+            
+            # Served straight from the result file; the full results are never held as a DataFrame
+            with open(batch_result['output_path'], 'rb') as results_file:
+                st.download_button(
+                    label="Download Results",
+                    data=results_file,
+                    file_name="anomaly_detection_results.csv",
+                    mime="text/csv"
+                )
+    else:
+        # The upload was cleared; its result file is no longer reachable
+        discard_batch_result()
+
+def render_model_performance_tab(data, model, features, cache_key):
+    st.subheader("Model Performance")
+    
+    # Metrics and the confusion matrix are computed once per dataset and model
+    performance = compute_performance_metrics(data, model, features, cache_key=cache_key)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Accuracy", f"{performance['accuracy']:.4f}")
+    
+    with col2:
+        st.metric("Precision", f"{performance['precision']:.4f}")
+    
+    with col3:
+        st.metric("Recall", f"{performance['recall']:.4f}")
+    
+    with col4:
+        st.metric("F1-Score", f"{performance['f1']:.4f}")
+    
+    # Confusion matrix
+    st.image(render_confusion_matrix(performance['confusion_matrix']))
+
+# Live stream settings: memory is bounded by the ring buffer, whatever the stream length
+LIVE_BUFFER_HEADROOM = 1.2  # Buffer holds window x rate events with room for bursts
+LIVE_MIN_BUFFER_CAPACITY = 10_000
+LIVE_REFRESH_SECONDS = 1.0
+LIVE_MAX_BATCH = 5000
+LIVE_MAX_CHART_BINS = 300
+LIVE_SCATTER_POINTS = 2000
+
+def live_buffer_capacity(rate, window_seconds):
+    """Ring buffer size that holds a full window at the given event rate"""
+    return max(LIVE_MIN_BUFFER_CAPACITY, int(rate * window_seconds * LIVE_BUFFER_HEADROOM))
+
+class TransactionRingBuffer:
+    """Fixed-size buffer of scored transactions backed by preallocated arrays"""
+    
+    def __init__(self, capacity=LIVE_MIN_BUFFER_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity)
+        self.amounts = np.zeros(capacity)
+        self.scores = np.zeros(capacity)
+        self.is_anomaly = np.zeros(capacity, dtype=bool)
+        self.next_index = 0
+        self.size = 0
+        self.total_events = 0
+        self.total_anomalies = 0
+    
+    def append(self, timestamps, amounts, scores):
+        """Append a scored micro-batch, overwriting the oldest entries when full"""
+        timestamps, amounts, scores = (np.asarray(values)[-self.capacity:] for values in (timestamps, amounts, scores))
+        n_new = len(timestamps)
+        positions = (self.next_index + np.arange(n_new)) % self.capacity
+        
+        self.timestamps[positions] = timestamps
+        self.amounts[positions] = amounts
+        self.scores[positions] = scores
+        self.is_anomaly[positions] = scores < 0
+        
+        self.next_index = (self.next_index + n_new) % self.capacity
+        self.size = min(self.size + n_new, self.capacity)
+        self.total_events += n_new
+        self.total_anomalies += int(np.sum(scores < 0))
+    
+    def snapshot(self, since=None):
+        """Return buffered columns in arrival order, optionally only entries newer than since"""
+        if self.size < self.capacity:
+            order = np.arange(self.size)
+        else:
+            order = (self.next_index + np.arange(self.capacity)) % self.capacity
+        if since is not None:
+            order = order[self.timestamps[order] >= since]
+        return {
+            'timestamp': self.timestamps[order],
+            'amount': self.amounts[order],
+            'anomaly_score': self.scores[order],
+            'is_anomaly': self.is_anomaly[order]
+        }
+
+class TransactionStream:
+    """Paces a transaction source to a configurable number of events per second"""
+    
+    def __init__(self, rate):
+        self.rate = rate
+        self.last_poll = time.monotonic()
+        self.carry = 0.0
+    
+    def poll(self, max_events=LIVE_MAX_BATCH):
+        """Return the events due since the previous poll"""
+        now = time.monotonic()
+        due = self.rate * (now - self.last_poll) + self.carry
+        self.last_poll = now
+        n_events = min(int(due), max_events)
+        # Keep fractional events for the next poll; drop the excess after a long pause
+        self.carry = due - n_events if n_events < max_events else 0.0
+        return self.read(n_events) if n_events else []
+    
+    def read(self, n_events):
+        raise NotImplementedError
+
+class GeneratorStream(TransactionStream):
+    """Synthetic stream using the generator logic from data/data_generator.py"""
+    
+    def read(self, n_events):
+        return [generate_transaction_data() for _ in range(n_events)]
+
+class JsonLinesFileStream(TransactionStream):
+    """Tails a JSON-lines file (e.g. data_generator.py --output-file) as a local queue stand-in"""
+    
+    def __init__(self, rate, path):
+        super().__init__(rate)
+        self.path = path
+        self.offset = 0
+    
+    def read(self, n_events):
+        events = []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            while len(events) < n_events:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # End of file or a line the writer has not finished yet
+                self.offset = f.tell()
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # Skip malformed lines rather than stalling the stream
+        return events
+
+def _event_hour(timestamp):
+    """Hour of an ISO timestamp, or NaN if it is missing or unparseable"""
+    if not isinstance(timestamp, str):
+        return np.nan
+    if timestamp.endswith('Z'):
+        timestamp = timestamp[:-1] + '+00:00'  # Not accepted by fromisoformat before Python 3.11
+    try:
+        return datetime.datetime.fromisoformat(timestamp).hour
+    except ValueError:
+        return np.nan
+
+def score_stream_batch(model, features, events):
+    """Derive features for a micro-batch of raw transactions and score them in one call.
+
+    Events without a usable amount or timestamp are dropped, like malformed lines in
+    JsonLinesFileStream, so one bad event cannot stop the stream.
+    """
+    batch = pd.DataFrame([event for event in events if isinstance(event, dict)])
+    batch['amount'] = pd.to_numeric(batch['amount'], errors='coerce') if 'amount' in batch.columns else np.nan
+    if 'transaction_hour' in batch.columns:
+        hours = pd.to_numeric(batch['transaction_hour'], errors='coerce')
+    else:
+        hours = pd.Series(np.nan, index=batch.index)
+    if 'timestamp' in batch.columns:
+        # Events that do not carry an hour get it from their timestamp
+        missing = hours.isna()
+        hours[missing] = [_event_hour(ts) for ts in batch.loc[missing, 'timestamp']]
+    batch['transaction_hour'] = hours
+    batch = batch.dropna(subset=features).reset_index(drop=True)
+    batch['anomaly_score'] = model.score_batch(batch[features]) if len(batch) else np.empty(0)
+    return batch
+
+def render_live_stream_charts(snapshot, window_seconds, now):
+    """Build rolling-window charts whose size does not depend on the event rate"""
+    # Event and anomaly rates in fixed time bins across the window
+    n_bins = min(window_seconds, LIVE_MAX_CHART_BINS)
+    bin_edges = np.linspace(now - window_seconds, now, n_bins + 1)
+    bin_seconds = window_seconds / n_bins
+    event_counts, _ = np.histogram(snapshot['timestamp'], bins=bin_edges)
+    anomaly_counts, _ = np.histogram(snapshot['timestamp'][snapshot['is_anomaly']], bins=bin_edges)
+    bin_times = pd.to_datetime(bin_edges[1:], unit='s')
+    
+    fig_rate = go.Figure()
+    fig_rate.add_trace(go.Scatter(x=bin_times, y=event_counts / bin_seconds, name='Events/s', line=dict(color='#4444ff')))
+    fig_rate.add_trace(go.Scatter(x=bin_times, y=anomaly_counts / bin_seconds, name='Anomalies/s', line=dict(color='#ff4444')))
+    fig_rate.update_layout(title='Throughput', xaxis_title='Time', yaxis_title='Events per second', height=350)
+    
+    # Most recent points only: all anomalies in that slice plus the normal ones
+    recent = slice(-LIVE_SCATTER_POINTS, None)
+    fig_points = px.scatter(
+        x=pd.to_datetime(snapshot['timestamp'][recent], unit='s'),
+        y=snapshot['amount'][recent],
+        color=snapshot['is_anomaly'][recent],
+        title=f'Latest {LIVE_SCATTER_POINTS:,} Transactions',
+        labels={'x': 'Time', 'y': 'Transaction Amount ($)', 'color': 'Anomaly'},
+        color_discrete_map={True: '#ff4444', False: '#4444ff'},
+        render_mode='webgl'
+    )
+    fig_points.update_layout(height=350)
+    
+    return fig_rate, fig_points
+
+def live_stream_fragment(model, features, window_seconds):
+    """Poll the stream, score the new micro-batch and redraw the rolling window"""
+    stream = st.session_state.get('live_stream')
+    if stream is None:
+        st.info("Start the stream to begin monitoring.")
+        return
+    
+    buffer = stream['buffer']
+    if stream['running']:
+        try:
+            events = stream['source'].poll()
+        except OSError as e:
+            events = []
+            st.error(f"Error reading stream: {e}")
+        if events:
+            # The online detector scores once it has a reference window, then learns from the batch
+            online_detector = stream['online_detector']
+            scorer = online_detector if online_detector is not None and online_detector.ready else model
+            batch = score_stream_batch(scorer, features, events)
+            stream['skipped'] = stream.get('skipped', 0) + len(events) - len(batch)
+            if online_detector is not None and len(batch):
+                online_detector.partial_update(batch[features])
+            # Spread arrival times across the poll interval so rate charts stay smooth
+            now = time.time()
+            arrivals = np.linspace(now - LIVE_REFRESH_SECONDS, now, len(batch) + 1)[1:]
+            buffer.append(arrivals, batch['amount'].to_numpy(), batch['anomaly_score'].to_numpy())
+    
+    now = time.time()
+    snapshot = buffer.snapshot(since=now - window_seconds)
+    recent_events = np.sum(snapshot['timestamp'] >= now - 10)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Events/s (last 10s)", f"{recent_events / 10:.1f}")
+    with col2:
+        st.metric(f"Anomalies (last {window_seconds}s)", f"{int(snapshot['is_anomaly'].sum()):,}")
+    with col3:
+        st.metric("Total Processed", f"{buffer.total_events:,}")
+    with col4:
+        st.metric("Total Anomalies", f"{buffer.total_anomalies:,}")
+    
+    if stream.get('skipped'):
+        st.caption(f"Skipped {stream['skipped']:,} malformed events (no usable amount or timestamp)")
+    
+    if len(snapshot['timestamp']) == 0:
+        st.caption("Waiting for events...")
+        return
+    
+    # The buffer is sized for the window and rate at start; a faster rate or longer window can outgrow it
+    covered_seconds = now - snapshot['timestamp'][0]
+    if buffer.size == buffer.capacity and covered_seconds < window_seconds - LIVE_REFRESH_SECONDS:
+        st.warning(f"Only the last {covered_seconds:.0f}s of the {window_seconds}s window fit in the buffer "
+                   f"({buffer.capacity:,} events). Restart the stream to resize it for the current rate and window.")
+    
+    fig_rate, fig_points = render_live_stream_charts(snapshot, window_seconds, now)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(fig_rate, use_container_width=True)
+    with col2:
+        st.plotly_chart(fig_points, use_container_width=True)
+
+def render_live_stream_tab(model, features):
+    st.subheader("Live Stream Monitoring")
+    st.write("Score a live transaction stream in micro-batches over a rolling time window:")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        source_type = st.radio("Source", ["Synthetic generator", "JSON-lines file"], horizontal=True)
+        file_path = None
+        if source_type == "JSON-lines file":
+            file_path = st.text_input("File path", value="transactions.jsonl")
+    
+    with col2:
+        rate = st.slider("Events per second", 10, 1000, 100, step=10)
+    
+    with col3:
+        window_seconds = st.selectbox("Window (seconds)", [60, 300, 900], index=0)
+        detector_choice = st.radio("Detector", ["Trained model", "Half-Space Trees (online)"], horizontal=True,
+                                   help="Half-Space Trees learns from the stream itself; the trained model scores until its first window fills")
+    
+    stream = st.session_state.get('live_stream')
+    running = stream is not None and stream['running']
+    
+    col1, col2, _ = st.columns([1, 1, 4])
+    with col1:
+        if st.button("▶️ Start", disabled=running):
+            if file_path is not None and not os.path.exists(file_path):
+                st.error(f"File not found: {file_path}")
+            else:
+                source = JsonLinesFileStream(rate, file_path) if file_path is not None else GeneratorStream(rate)
+                online_detector = HalfSpaceTreesDetector() if detector_choice == "Half-Space Trees (online)" else None
+                st.session_state['live_stream'] = {
+                    'source': source, 'buffer': TransactionRingBuffer(live_buffer_capacity(rate, window_seconds)),
+                    'online_detector': online_detector, 'running': True
+                }
+                running = True
+    with col2:
+        if st.button("⏹️ Stop", disabled=not running):
+            st.session_state['live_stream']['running'] = False
+            running = False
+    
+    if running:
+        st.session_state['live_stream']['source'].rate = rate
+    
+    # Only this fragment reruns on each tick while the stream is running
+    st.fragment(run_every=LIVE_REFRESH_SECONDS if running else None)(live_stream_fragment)(model, features, window_seconds)
+
+def render_about_tab():
+    st.subheader("About This Project")
+    
+    st.markdown("""
+    ### 🚀 Azure MLOps Anomaly Detection
+    
+    This Streamlit application demonstrates the capabilities of our **End-to-End MLOps Pipeline for Real-time Anomaly Detection on Azure**.
+    
+    #### 🔧 Key Features:
+    - **Real-time Anomaly Detection**: Using Isolation Forest algorithm
+    - **Synthetic Data Generation**: Realistic transaction data simulation
+    - **Interactive Visualizations**: Explore patterns and anomalies
+    - **Batch Processing**: Upload CSV files for bulk analysis
+    - **Model Performance Metrics**: Comprehensive evaluation
+    
+    #### 🏗️ Full Azure Architecture:
+    The complete project includes:
+    - **Azure Event Hubs**: Real-time data ingestion
+    - **Azure Data Lake Storage**: Scalable data storage
+    - **Azure Databricks**: Data processing and feature engineering
+    - **Azure Machine Learning**: Model training and deployment
+    - **Azure Functions**: Real-time inference
+    - **Terraform**: Infrastructure as Code
+    - **GitHub Actions**: CI/CD pipeline
+    
+    #### 📊 Use Cases:
+    - **Fraud Detection**: Identify suspicious financial transactions
+    - **Network Security**: Detect unusual network activity
+    - **IoT Monitoring**: Flag sensor anomalies
+    - **Quality Control**: Identify manufacturing defects
+    
+    #### 🛠️ Technologies:
+    - **Python**: Core programming language
+    - **Scikit-learn**: Machine learning algorithms
+    - **Streamlit**: Web application framework
+    - **Plotly**: Interactive visualizations
+    - **Pandas**: Data manipulation
+    - **NumPy**: Numerical computing
+    
+    #### 📈 Business Impact:
+    - **Reduced Financial Losses**: Quick fraud detection
+    - **Improved Security**: Proactive threat identification
+    - **Operational Efficiency**: Automated anomaly detection
+    - **Cost Savings**: Reduced manual monitoring
+    
+    ---
+    
+    **GitHub Repository**: [Azure MLOps Anomaly Detector](https://github.com/MukeshPyatla/azure-mlops-anomaly-detector)
+    """)
+
+TABS = ["📊 Data Analysis", "🔍 Live Detection", "📡 Live Stream", "📈 Model Performance", "📋 About"]
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">🚀 Azure MLOps Anomaly Detector</h1>', unsafe_allow_html=True)
@@ -192,20 +1001,28 @@ def main():
     
     # Data generation
     st.sidebar.subheader("Data Generation")
-    n_samples = st.sidebar.slider("Number of samples", 100, 5000, 1000)
+    n_samples = st.sidebar.select_slider("Number of samples", options=SAMPLE_SIZE_OPTIONS, value=1000)
     
+    # New data means a new seed; earlier datasets and models stay cached
+    if 'data_seed' not in st.session_state:
+        st.session_state['data_seed'] = 42
     if st.sidebar.button("Generate New Data"):
-        st.cache_data.clear()
-        st.cache_resource.clear()
-        st.rerun()
+        st.session_state['data_seed'] += 1
+    seed = st.session_state['data_seed']
+    st.sidebar.caption(f"Data seed: {seed}")
+    
+    # Model hyperparameters
+    st.sidebar.subheader("Model")
+    contamination = st.sidebar.select_slider("Contamination", options=[0.01, 0.02, 0.05, 0.1], value=0.05)
+    n_estimators = st.sidebar.select_slider("Number of trees", options=[50, 100, 200], value=100)
     
     # Generate data
     with st.spinner("Generating synthetic transaction data..."):
-        data = generate_synthetic_data(n_samples)
+        data = generate_synthetic_data(n_samples, seed)
     
-    # Train model
+    # Train model (or load it from the model cache)
     with st.spinner("Training anomaly detection model..."):
-        model, features = train_anomaly_model(data)
+        model, features = get_anomaly_model(n_samples, seed, contamination, n_estimators)
     
     # Main content
     col1, col2, col3, col4 = st.columns(4)
@@ -224,207 +1041,21 @@ def main():
         avg_amount = data['amount'].mean()
         st.metric("Avg Transaction", f"${avg_amount:.2f}")
     
-    # Tabs for different functionalities
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Data Analysis", "🔍 Live Detection", "📈 Model Performance", "📋 About"])
-    
-    with tab1:
-        st.subheader("Data Analysis")
-        
-        # Create visualizations
-        fig_scatter, fig_hist, fig_hour, fig_model = create_visualizations(data, model, features)
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.plotly_chart(fig_scatter, use_container_width=True)
-            st.plotly_chart(fig_hist, use_container_width=True)
-        
-        with col2:
-            st.plotly_chart(fig_hour, use_container_width=True)
-            st.plotly_chart(fig_model, use_container_width=True)
-        
-        # Data table
-        st.subheader("Sample Data")
-        st.dataframe(data.head(10), use_container_width=True)
-    
-    with tab2:
-        st.subheader("Live Anomaly Detection")
-        st.write("Enter transaction details to detect anomalies in real-time:")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            amount = st.number_input("Transaction Amount ($)", min_value=0.01, max_value=100000.0, value=100.0, step=0.01)
-            hour = st.slider("Transaction Hour", 0, 23, 12)
-        
-        with col2:
-            user_id = st.text_input("User ID", value="USER1234")
-            device_type = st.selectbox("Device Type", ["mobile", "desktop", "tablet"])
-        
-        # Create transaction data
-        transaction_data = {
-            'amount': amount,
-            'transaction_hour': hour,
-            'user_id': user_id,
-            'device_type': device_type,
-            'timestamp': datetime.datetime.now().isoformat()
-        }
-        
-        if st.button("🔍 Detect Anomaly", type="primary"):
-            # Get prediction
-            prediction = predict_anomaly(model, features, transaction_data)
-            
-            # Display results
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("### Transaction Details")
-                st.json(transaction_data)
-            
-            with col2:
-                st.markdown("### Detection Results")
-                
-                if prediction['is_anomaly']:
-                    st.markdown('<div class="anomaly-alert">🚨 ANOMALY DETECTED</div>', unsafe_allow_html=True)
-                else:
-                    st.markdown('<div class="normal-alert">✅ NORMAL TRANSACTION</div>', unsafe_allow_html=True)
-                
-                st.metric("Anomaly Score", f"{prediction['anomaly_score']:.4f}")
-                st.metric("Confidence", f"{prediction['confidence']:.4f}")
-                
-                # Explanation
-                if prediction['is_anomaly']:
-                    st.info("This transaction was flagged as anomalous due to unusual patterns in amount, timing, or other features.")
-                else:
-                    st.success("This transaction appears to follow normal patterns.")
-        
-        # Batch prediction
-        st.subheader("Batch Prediction")
-        st.write("Upload a CSV file with transaction data for batch anomaly detection:")
-        
-        uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
-        
-        if uploaded_file is not None:
-            try:
-                batch_data = pd.read_csv(uploaded_file)
-                
-                if all(feature in batch_data.columns for feature in features):
-                    # Make predictions
-                    X_batch = batch_data[features]
-                    anomaly_scores = model.decision_function(X_batch)
-                    predictions = anomaly_scores < 0
-                    
-                    # Add predictions to data
-                    batch_data['anomaly_score'] = anomaly_scores
-                    batch_data['is_anomaly'] = predictions
-                    
-                    st.success(f"Processed {len(batch_data)} transactions")
-                    st.dataframe(batch_data, use_container_width=True)
-                    
-                    # Download results
-                    csv = batch_data.to_csv(index=False)
-                    st.download_button(
-                        label="Download Results",
-                        data=csv,
-                        file_name="anomaly_detection_results.csv",
-                        mime="text/csv"
-                    )
-                else:
-                    st.error(f"CSV must contain columns: {features}")
-            except Exception as e:
-                st.error(f"Error processing file: {str(e)}")
-    
-    with tab3:
-        st.subheader("Model Performance")
-        
-        # Calculate metrics
-        predictions = model.predict(data[features])
-        y_true = data['is_anomaly'].astype(int)
-        y_pred = (predictions == -1).astype(int)  # -1 means anomaly in Isolation Forest
-        
-        accuracy = accuracy_score(y_true, y_pred)
-        precision = precision_score(y_true, y_pred, zero_division=0)
-        recall = recall_score(y_true, y_pred, zero_division=0)
-        f1 = f1_score(y_true, y_pred, zero_division=0)
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric("Accuracy", f"{accuracy:.4f}")
-        
-        with col2:
-            st.metric("Precision", f"{precision:.4f}")
-        
-        with col3:
-            st.metric("Recall", f"{recall:.4f}")
-        
-        with col4:
-            st.metric("F1-Score", f"{f1:.4f}")
-        
-        # Confusion matrix
-        from sklearn.metrics import confusion_matrix
-        import seaborn as sns
-        import matplotlib.pyplot as plt
-        
-        cm = confusion_matrix(y_true, y_pred)
-        
-        fig, ax = plt.subplots(figsize=(8, 6))
-        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', ax=ax)
-        ax.set_title('Confusion Matrix')
-        ax.set_xlabel('Predicted')
-        ax.set_ylabel('Actual')
-        
-        st.pyplot(fig)
+    # Only the selected view is computed; the others cost nothing on a rerun
+    cache_key = (n_samples, seed, contamination, n_estimators)
+    active_tab = st.radio("View", TABS, horizontal=True, key="active_tab", label_visibility="collapsed")
     
-    with tab4:
-        st.subheader("About This Project")
-        
-        st.markdown("""
-        ### 🚀 Azure MLOps Anomaly Detection
-        
-        This Streamlit application demonstrates the capabilities of our **End-to-End MLOps Pipeline for Real-time Anomaly Detection on Azure**.
-        
-        #### 🔧 Key Features:
-        - **Real-time Anomaly Detection**: Using Isolation Forest algorithm
-        - **Synthetic Data Generation**: Realistic transaction data simulation
-        - **Interactive Visualizations**: Explore patterns and anomalies
-        - **Batch Processing**: Upload CSV files for bulk analysis
-        - **Model Performance Metrics**: Comprehensive evaluation
-        
-        #### 🏗️ Full Azure Architecture:
-        The complete project includes:
-        - **Azure Event Hubs**: Real-time data ingestion
-        - **Azure Data Lake Storage**: Scalable data storage
-        - **Azure Databricks**: Data processing and feature engineering
-        - **Azure Machine Learning**: Model training and deployment
-        - **Azure Functions**: Real-time inference
-        - **Terraform**: Infrastructure as Code
-        - **GitHub Actions**: CI/CD pipeline
-        
-        #### 📊 Use Cases:
-        - **Fraud Detection**: Identify suspicious financial transactions
-        - **Network Security**: Detect unusual network activity
-        - **IoT Monitoring**: Flag sensor anomalies
-        - **Quality Control**: Identify manufacturing defects
-        
-        #### 🛠️ Technologies:
-        - **Python**: Core programming language
-        - **Scikit-learn**: Machine learning algorithms
-        - **Streamlit**: Web application framework
-        - **Plotly**: Interactive visualizations
-        - **Pandas**: Data manipulation
-        - **NumPy**: Numerical computing
-        
-        #### 📈 Business Impact:
-        - **Reduced Financial Losses**: Quick fraud detection
-        - **Improved Security**: Proactive threat identification
-        - **Operational Efficiency**: Automated anomaly detection
-        - **Cost Savings**: Reduced manual monitoring
-        
-        ---
-        
-        **GitHub Repository**: [Azure MLOps Anomaly Detector](https://github.com/MukeshPyatla/azure-mlops-anomaly-detector)
-        """)
+    if active_tab == TABS[0]:
+        render_data_analysis_tab(data, model, features, cache_key)
+    elif active_tab == TABS[1]:
+        live_detection_fragment(model, features)
+        batch_prediction_fragment(model, features)
+    elif active_tab == TABS[2]:
+        render_live_stream_tab(model, features)
+    elif active_tab == TABS[3]:
+        render_model_performance_tab(data, model, features, cache_key)
+    else:
+        render_about_tab()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
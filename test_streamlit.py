@@ -60,12 +60,113 @@ def test_streamlit_app():
         prediction = predict_anomaly(model, features, test_transaction)
         print(f"✅ Made prediction: {prediction}")
         
+        # Test that the explained score matches the plain score
+        import pandas as pd
+        plain_score = model.score_batch(pd.DataFrame([test_transaction])[features])[0]
+        assert prediction['explanation'] is not None
+        assert abs(prediction['anomaly_score'] - plain_score) < 1e-9
+        print(f"✅ Explanation: {prediction['explanation']}")
+        
         return True
         
     except Exception as e:
         print(f"❌ Error testing Streamlit app: {e}")
         return False
 
+def test_batch_scoring():
+    """Test chunked batch scoring of a CSV file"""
+    try:
+        import os
+        import tempfile
+        import pandas as pd
+        from streamlit_app import generate_synthetic_data, train_anomaly_model, score_csv_in_chunks, read_result_page
+        
+        print("Testing chunked batch scoring...")
+        
+        data = generate_synthetic_data(100)
+        model, features = train_anomaly_model(data)
+        
+        output_fd, output_path = tempfile.mkstemp(suffix=".csv")
+        os.close(output_fd)
+        try:
+            result = score_csv_in_chunks(model, features, "sample_transactions.csv", output_path, chunksize=3, page_size=2)
+            expected_rows = len(pd.read_csv("sample_transactions.csv"))
+            assert result['total_rows'] == expected_rows
+            assert len(pd.read_csv(output_path)) == expected_rows
+            assert result['top_anomalies']['anomaly_score'].is_monotonic_increasing
+            page = read_result_page(result, 1)
+            assert page.equals(pd.read_csv(output_path).iloc[2:4].reset_index(drop=True))
+            print(f"✅ Scored {result['total_rows']} rows in chunks, {result['anomaly_count']} anomalies")
+        finally:
+            os.remove(output_path)
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing batch scoring: {e}")
+        return False
+
+def test_model_cache():
+    """Test the on-disk model cache and its LRU eviction"""
+    try:
+        import os
+        import tempfile
+        from streamlit_app import model_cache_key, load_cached_model, save_cached_model
+        
+        print("Testing on-disk model cache...")
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            keys = [model_cache_key(n_samples=100, seed=seed, contamination=0.05, n_estimators=100) for seed in range(3)]
+            assert len(set(keys)) == 3
+            
+            assert load_cached_model(keys[0], cache_dir=cache_dir) is None
+            for key in keys:
+                save_cached_model(key, {'key': key}, cache_dir=cache_dir, max_entries=2)
+            
+            # The oldest entry is evicted once the entry limit is exceeded
+            assert load_cached_model(keys[0], cache_dir=cache_dir) is None
+            assert load_cached_model(keys[2], cache_dir=cache_dir) == {'key': keys[2]}
+            assert len(os.listdir(cache_dir)) == 2
+            print("✅ Model cache stores, loads and evicts entries")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing model cache: {e}")
+        return False
+
+def test_live_stream_buffer():
+    """Test that the live stream ring buffer keeps a fixed size"""
+    try:
+        import numpy as np
+        from streamlit_app import TransactionRingBuffer, score_stream_batch, generate_synthetic_data, train_anomaly_model
+        
+        print("Testing live stream ring buffer...")
+        
+        buffer = TransactionRingBuffer(capacity=5)
+        buffer.append([1.0, 2.0, 3.0], [10.0, 20.0, 30.0], [0.1, -0.1, 0.1])
+        buffer.append([4.0, 5.0, 6.0, 7.0], [40.0, 50.0, 60.0, 70.0], [0.1, 0.1, -0.2, 0.1])
+        
+        snapshot = buffer.snapshot()
+        assert list(snapshot['timestamp']) == [3.0, 4.0, 5.0, 6.0, 7.0]
+        assert list(buffer.snapshot(since=6.0)['amount']) == [60.0, 70.0]
+        assert buffer.total_events == 7 and buffer.total_anomalies == 2
+        assert np.sum(snapshot['is_anomaly']) == 1
+        print("✅ Ring buffer overwrites the oldest events in arrival order")
+        
+        # Malformed events are dropped instead of failing the whole micro-batch
+        model, features = train_anomaly_model(generate_synthetic_data(100))
+        events = [{'amount': 10.0, 'timestamp': '2024-01-01T03:00:00Z'}, {'amount': 20.0}, {'timestamp': 'bad', 'amount': 5.0}, [1, 2]]
+        batch = score_stream_batch(model, features, events)
+        assert list(batch['transaction_hour']) == [3]
+        print("✅ Malformed stream events are skipped")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing live stream buffer: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("🚀 Testing Azure MLOps Anomaly Detector Streamlit App")
@@ -76,7 +177,7 @@ def main():
     
     if imports_ok:
         # Test app functionality
-        app_ok = test_streamlit_app()
+        app_ok = test_streamlit_app() and test_batch_scoring() and test_model_cache() and test_live_stream_buffer()
         
         if app_ok:
             print("\n🎉 All tests passed! The app is ready to deploy.")
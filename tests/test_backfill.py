@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch rescoring job: scored output layout and resuming from the progress file.
+Run with: python -m pytest tests/test_backfill.py
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "models"))
+
+from backfill import PARTITION_COLUMN, PROGRESS_FILENAME, run_backfill
+from detectors import FEATURE_NAMES, IsolationForestDetector
+
+@pytest.fixture
+def backfill_dirs(tmp_path):
+    rng = np.random.RandomState(0)
+    train_df = pd.DataFrame({"amount": rng.lognormal(4, 1, 500), "transaction_hour": rng.randint(0, 24, 500)})
+    model_path = str(tmp_path / "model.joblib")
+    IsolationForestDetector(n_estimators=10).fit(train_df[FEATURE_NAMES]).serialize(model_path)
+
+    # Two partitions in the processed layout; the partition column lives in the directory name
+    input_root = tmp_path / "processed"
+    for hour in (3, 23):
+        partition_dir = input_root / f"{PARTITION_COLUMN}={hour}"
+        partition_dir.mkdir(parents=True)
+        pd.DataFrame({"transaction_id": [f"{hour}-{i}" for i in range(5)],
+                      "amount": rng.lognormal(4, 1, 5)}).to_parquet(str(partition_dir / "part-00000.parquet"))
+    return str(input_root), str(tmp_path / "scores"), model_path
+
+def read_scored_at(path):
+    return pq.read_table(path).column("scored_at").to_pylist()
+
+def test_resume_rescores_only_missing_files(backfill_dirs, capsys):
+    input_root, output_root, model_path = backfill_dirs
+    progress = run_backfill(input_root, output_root, model_path, "7", n_jobs=1)
+    assert {partition: state["status"] for partition, state in progress["partitions"].items()} == {
+        f"{PARTITION_COLUMN}=3": "done", f"{PARTITION_COLUMN}=23": "done"}
+
+    kept_path = os.path.join(output_root, f"{PARTITION_COLUMN}=3", "part-00000.parquet")
+    deleted_path = os.path.join(output_root, f"{PARTITION_COLUMN}=23", "part-00000.parquet")
+    table = pq.read_table(deleted_path)
+    assert table.column("model_version").to_pylist() == ["7"] * 5
+    assert table.column("anomaly_score").null_count == 0
+    kept_scored_at = read_scored_at(kept_path)
+
+    # Simulate a run interrupted before the second partition's file was recorded
+    os.remove(deleted_path)
+    progress_path = os.path.join(output_root, PROGRESS_FILENAME)
+    with open(progress_path) as f:
+        saved = json.load(f)
+    saved["partitions"][f"{PARTITION_COLUMN}=23"]["done_files"] = []
+    with open(progress_path, "w") as f:
+        json.dump(saved, f)
+    capsys.readouterr()
+
+    progress = run_backfill(input_root, output_root, model_path, "7", n_jobs=1)
+    assert "Backfilling 1 files across 2 partitions" in capsys.readouterr().out
+    assert os.path.exists(deleted_path)
+    assert read_scored_at(kept_path) == kept_scored_at  # Not rewritten
+    assert progress["partitions"][f"{PARTITION_COLUMN}=23"]["status"] == "done"
+
+def test_other_model_version_is_rejected(backfill_dirs):
+    input_root, output_root, model_path = backfill_dirs
+    run_backfill(input_root, output_root, model_path, "7", n_jobs=1)
+    with pytest.raises(ValueError, match="model version 7"):
+        run_backfill(input_root, output_root, model_path, "8", n_jobs=1)
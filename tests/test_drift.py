@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for drift monitoring: the training baseline (src/models/drift.py) and the Azure Function's
+sliding-window monitor (drift_monitor.py). Run with: python -m pytest tests/test_drift.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "inference", "AnomalyDetectorFunction", "AnomalyHubTrigger"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "models"))
+
+from drift import BIN_EDGES, build_baseline, histogram
+from drift_monitor import (DriftMonitor, SlidingWindowHistogram, _bin_counts, ks_statistic,
+                           population_stability_index)
+
+def transactions(n, seed=0, amount_scale=1.0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({"amount": rng.lognormal(4, 1, n) * amount_scale, "transaction_hour": rng.randint(0, 24, n)})
+
+@pytest.fixture(scope="module")
+def baseline():
+    train_df = transactions(20_000)
+    return build_baseline(train_df, np.random.RandomState(1).normal(0.1, 0.05, len(train_df)), model_version="3")
+
+def test_identical_distributions_do_not_drift(baseline):
+    expected = baseline["histograms"]["amount"]["proportions"]
+    counts = histogram(transactions(20_000)["amount"], BIN_EDGES["amount"])
+    assert population_stability_index(expected, counts) == pytest.approx(0, abs=0.01)
+    assert ks_statistic(expected, counts) < 0.02
+
+    # The Function bins live values exactly as training did
+    assert _bin_counts(transactions(20_000)["amount"], BIN_EDGES["amount"]).tolist() == counts.tolist()
+
+def test_shifted_distribution_crosses_threshold(baseline):
+    expected = baseline["histograms"]["amount"]["proportions"]
+    shifted = histogram(transactions(20_000, seed=2, amount_scale=5)["amount"], BIN_EDGES["amount"])
+    assert population_stability_index(expected, shifted) > 0.2
+    assert ks_statistic(expected, shifted) > 0.15
+
+def test_window_buckets_expire():
+    window = SlidingWindowHistogram([0, 1, 2], window_seconds=60, n_buckets=6)  # 10 s buckets
+    window.add([0.5, 0.5], now=0)
+    window.add([1.5], now=25)
+    assert window.counts(now=25).tolist() == [2, 1]
+    assert window.counts(now=59).tolist() == [2, 1]
+    assert window.counts(now=60).tolist() == [0, 1]  # The first bucket has left the window
+    assert window.counts(now=200).tolist() == [0, 0]
+
+def test_monitor_check_interval_and_cooldown(baseline):
+    monitor = DriftMonitor(baseline, window_seconds=3600, check_interval_seconds=60, min_events=500,
+                           retrain_cooldown_seconds=600)
+    monitor._last_check = 0
+    drifted = transactions(2_000, seed=3, amount_scale=5)
+    monitor.observe("amount", drifted["amount"], now=10)
+
+    assert monitor.check(now=30) is None  # Before the check interval
+    report = monitor.check(now=60)
+    assert report["drifted"] == ["amount"]
+    assert report["retrain"]
+    assert report["baseline_model_version"] == "3"
+    # transaction_hour and anomaly_score had too few events to compare
+    assert set(report["metrics"]) == {"amount"}
+
+    # Still drifted, but the retrain signal is held back until the cooldown has passed
+    assert not monitor.check(now=120)["retrain"]
+    assert monitor.check(now=660)["retrain"]
+
+def test_monitor_without_drift(baseline):
+    monitor = DriftMonitor(baseline, check_interval_seconds=60, min_events=500)
+    monitor._last_check = 0
+    live = transactions(2_000, seed=4)
+    monitor.observe("amount", live["amount"], now=0)
+    monitor.observe("transaction_hour", live["transaction_hour"], now=0)
+    report = monitor.check(now=60)
+    assert report["drifted"] == [] and not report["retrain"]
+    assert report["metrics"]["amount"]["psi"] < 0.1
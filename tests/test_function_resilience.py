@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for the Azure Function's latency guard: hedged endpoint calls, the circuit
+breaker and the local fallback model. Run with: python -m pytest tests/test_function_resilience.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "inference", "AnomalyDetectorFunction", "AnomalyHubTrigger"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "models"))
+
+from resilience import CircuitBreaker, hedged_call
+from fallback_model import load_fallback_model
+from detectors import FEATURE_NAMES, IsolationForestDetector
+
+def run_hedged(call, budget_seconds, hedge_delay):
+    executor = ThreadPoolExecutor(max_workers=4)
+    try:
+        return asyncio.run(hedged_call(call, time.monotonic() + budget_seconds, hedge_delay, executor))
+    finally:
+        executor.shutdown(wait=False)
+
+def test_hedge_wins_when_primary_is_slow():
+    calls = []
+    def call(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.5)  # Slow primary
+            return "primary"
+        return "hedge"
+
+    start = time.monotonic()
+    result, hedged = run_hedged(call, budget_seconds=2.0, hedge_delay=0.05)
+    assert (result, hedged) == ("hedge", True)
+    assert time.monotonic() - start < 0.4
+    assert len(calls) == 2
+
+def test_fast_primary_is_not_hedged():
+    calls = []
+    def call(timeout):
+        calls.append(timeout)
+        return "primary"
+
+    assert run_hedged(call, budget_seconds=2.0, hedge_delay=0.2) == ("primary", False)
+    assert len(calls) == 1
+
+def test_both_calls_fail():
+    calls = []
+    def call(timeout):
+        calls.append(timeout)
+        raise ConnectionError(f"attempt {len(calls)} failed")
+
+    with pytest.raises(ConnectionError):
+        run_hedged(call, budget_seconds=2.0, hedge_delay=0.05)
+    assert len(calls) == 2  # A failed primary is hedged once, never retried further
+
+def test_deadline_runs_out():
+    def call(timeout):
+        time.sleep(0.5)
+        return "too late"
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        run_hedged(call, budget_seconds=0.2, hedge_delay=0.05)
+    assert time.monotonic() - start < 0.4
+
+def test_circuit_breaker_state_changes():
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=0.1, slow_call_seconds=1.0)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+    # closed -> open after consecutive failures; slow successes count as failures
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success(seconds=2.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    # open -> half-open after open_seconds, letting exactly one trial call through
+    time.sleep(0.15)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    # A failed trial opens the circuit again
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # half-open -> closed after a successful trial
+    time.sleep(0.15)
+    assert breaker.allow_request()
+    breaker.record_success(seconds=0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+def test_fallback_model_matches_detector(tmp_path):
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame({"amount": rng.lognormal(4, 1, 2000), "transaction_hour": rng.randint(0, 24, 2000)})
+    detector = IsolationForestDetector(n_estimators=25, random_state=0).fit(X[FEATURE_NAMES])
+    path = str(tmp_path / "fallback_model.npz")
+    detector.export_compact(path)
+
+    fallback = load_fallback_model(path)
+    np.testing.assert_allclose(fallback.score(X.to_dict("records")), detector.score_batch(X[FEATURE_NAMES]))
+    assert load_fallback_model(str(tmp_path / "missing.npz")) is None
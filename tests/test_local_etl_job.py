@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the Spark-free ETL job: Avro container decoding and the staged commit of its output.
+Run with: python -m pytest tests/test_local_etl_job.py
+"""
+
+import json
+import os
+import sys
+import zlib
+
+import pyarrow.parquet as pq
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "data"))
+
+from local_etl_job import (CAPTURE_SCHEMA, PARTITION_COLUMN, _bytes_field, _long_bytes,
+                           iter_avro_records, run_etl, write_capture_file)
+
+BODIES = [
+    {"transaction_id": "1", "user_id": "1001", "amount": 12.5, "timestamp": "2024-01-01T03:15:00.000001",
+     "is_fraud": False, "ip_address": "1.2.3.4", "device_type": "mobile", "merchant_id": "7"},
+    {"transaction_id": "2", "user_id": "1002", "amount": 9000, "timestamp": "2024-01-01T23:59:59.999999",
+     "is_fraud": True, "ip_address": "5.6.7.8", "device_type": "desktop", "merchant_id": "8"},
+]
+
+def write_avro(path, records, codec):
+    """Writes CAPTURE_SCHEMA records with non-empty maps, independently of write_capture_file."""
+    sync_marker = b"0123456789abcdef"
+    metadata = {"avro.schema": json.dumps(CAPTURE_SCHEMA).encode("utf-8"), "avro.codec": codec.encode("utf-8")}
+    with open(path, "wb") as f:
+        f.write(b"Obj\x01" + _long_bytes(len(metadata)))
+        for key, value in metadata.items():
+            f.write(_bytes_field(key.encode("utf-8")) + _bytes_field(value))
+        f.write(_long_bytes(0) + sync_marker)
+        # Two records per block so the reader crosses block boundaries
+        for block_start in range(0, len(records), 2):
+            block = bytearray()
+            for record in records[block_start:block_start + 2]:
+                block += _long_bytes(record["SequenceNumber"])
+                block += _bytes_field(record["Offset"].encode("utf-8"))
+                block += _bytes_field(record["EnqueuedTimeUtc"].encode("utf-8"))
+                # SystemProperties: one long and one string entry (union branches 0 and 2)
+                block += _long_bytes(2)
+                block += _bytes_field(b"x-opt-sequence-number") + _long_bytes(0) + _long_bytes(record["SequenceNumber"])
+                block += _bytes_field(b"x-opt-partition-key") + _long_bytes(2) + _bytes_field(b"user")
+                block += _long_bytes(0)
+                # Properties: a negative block count is followed by the block's byte size
+                entry = _bytes_field(b"source") + _long_bytes(4)  # null branch
+                block += _long_bytes(-1) + _long_bytes(len(entry)) + entry + _long_bytes(0)
+                if record["Body"] is None:
+                    block += _long_bytes(0)
+                else:
+                    block += _long_bytes(1) + _bytes_field(record["Body"])
+            if codec == "deflate":
+                compressor = zlib.compressobj(wbits=-15)
+                block = compressor.compress(bytes(block)) + compressor.flush()
+            n_records = len(records[block_start:block_start + 2])
+            f.write(_long_bytes(n_records) + _long_bytes(len(block)) + bytes(block) + sync_marker)
+
+@pytest.mark.parametrize("codec", ["null", "deflate"])
+def test_avro_round_trip(tmp_path, codec):
+    records = [
+        {"SequenceNumber": i, "Offset": str(i * 512), "EnqueuedTimeUtc": "1/1/2024 3:15:00 AM",
+         "Body": json.dumps(body).encode("utf-8") if body is not None else None}
+        for i, body in enumerate(BODIES + [None, {"amount": -1}])
+    ]
+    path = str(tmp_path / f"{codec}.avro")
+    write_avro(path, records, codec)
+
+    decoded = list(iter_avro_records(path))
+    assert [record["Body"] for record in decoded] == [record["Body"] for record in records]
+    assert [record["SequenceNumber"] for record in decoded] == [0, 1, 2, 3]
+    assert decoded[0]["SystemProperties"] == {"x-opt-sequence-number": 0, "x-opt-partition-key": "user"}
+    assert decoded[3]["Properties"] == {"source": None}
+
+def test_run_etl_writes_spark_layout(tmp_path):
+    input_root = tmp_path / "raw" / "ns" / "eh" / "0"
+    input_root.mkdir(parents=True)
+    write_capture_file(str(input_root / "00.avro"), BODIES + ["not an object"])
+    output_root = tmp_path / "processed"
+
+    assert run_etl(str(tmp_path / "raw"), str(output_root), n_jobs=1) == 3
+    assert sorted(os.listdir(output_root)) == ["_SUCCESS", f"{PARTITION_COLUMN}=23", f"{PARTITION_COLUMN}=3",
+                                               f"{PARTITION_COLUMN}=__HIVE_DEFAULT_PARTITION__"]
+    table = pq.read_table(str(next((output_root / f"{PARTITION_COLUMN}=23").iterdir())))
+    assert table.schema.names == ["transaction_id", "user_id", "amount", "timestamp", "timestamp_utc",
+                                  "is_fraud", "ip_address", "device_type", "merchant_id"]
+    assert table.column("amount").to_pylist() == [9000.0]
+
+def test_failed_run_leaves_no_partial_output(tmp_path):
+    input_root = tmp_path / "raw"
+    input_root.mkdir()
+    write_capture_file(str(input_root / "00.avro"), BODIES)
+    (input_root / "01.avro").write_bytes(b"not an avro file")
+
+    # Another job's staging directory under the same output root must survive this job's cleanup
+    output_root = tmp_path / "processed"
+    other_job = output_root / "_temporary" / "other-job"
+    other_job.mkdir(parents=True)
+
+    with pytest.raises(ValueError):
+        run_etl(str(input_root), str(output_root), n_jobs=1)
+    assert sorted(os.listdir(output_root)) == ["_temporary"]
+    assert os.listdir(output_root / "_temporary") == ["other-job"]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the scoring script: model version discovery, LRU eviction, hot-swap from the
+watch directory, shadow scoring and segment routing. Run with: python -m pytest tests/test_score_registry.py
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "models"))
+
+import score
+from detectors import FEATURE_NAMES, HalfSpaceTreesDetector, IsolationForestDetector
+
+MODEL_NAME = "anomaly-detection-model"
+
+@pytest.fixture(scope="module")
+def X():
+    rng = np.random.RandomState(0)
+    return pd.DataFrame({"amount": rng.lognormal(4, 1, 500), "transaction_hour": rng.randint(0, 24, 500)})
+
+def publish_version(root, version, X, seed=0):
+    version_dir = root / MODEL_NAME / str(version)
+    version_dir.mkdir(parents=True)
+    IsolationForestDetector(n_estimators=10, random_state=seed).fit(X[FEATURE_NAMES]).serialize(
+        str(version_dir / "model.joblib"))
+    return version_dir
+
+def test_discovers_versions_from_both_roots(tmp_path, X):
+    model_root, watch_root = tmp_path / "deployed", tmp_path / "watched"
+    publish_version(model_root, 1, X)
+    publish_version(model_root, 2, X)
+    publish_version(watch_root, 10, X)
+    (watch_root / MODEL_NAME / ".11.tmp").mkdir()  # A publish still in progress is not a version
+
+    registry = score.ModelRegistry(str(model_root), MODEL_NAME, watch_root=str(watch_root))
+    versions = registry.discover_versions()
+    assert sorted(versions) == ["1", "10", "2"]
+    assert versions["1"].startswith(str(model_root))
+    assert versions["10"].startswith(str(watch_root))
+
+    # "latest" follows the numerically newest version, a pinned version is served as is
+    assert registry.refresh()
+    assert registry.serving[0] == "10"
+    pinned = score.ModelRegistry(str(model_root), MODEL_NAME, serving_version="2", watch_root=str(watch_root))
+    pinned.refresh()
+    assert pinned.serving[0] == "2"
+    with pytest.raises(ValueError):
+        score.ModelRegistry(str(model_root), MODEL_NAME, serving_version="7").refresh()
+
+def test_lru_eviction_keeps_serving_and_pinned_versions(tmp_path, X):
+    for version in range(1, 5):
+        publish_version(tmp_path, version, X)
+    registry = score.ModelRegistry(str(tmp_path), MODEL_NAME, max_loaded_versions=2)
+    registry.refresh()  # Serves 4
+    registry.pinned_versions.add("1")
+
+    registry.get("1")
+    assert list(registry._models) == ["4", "1"]
+    registry.get("2")  # Over the bound, but the serving, pinned and just-loaded versions all stay
+    assert list(registry._models) == ["4", "1", "2"]
+    registry.get("3")  # 2 is now the least recently used unprotected version
+    assert list(registry._models) == ["4", "1", "3"]
+
+def test_watcher_swaps_in_published_version(tmp_path, X):
+    model_root, watch_root = tmp_path / "deployed", tmp_path / "watched"
+    publish_version(model_root, 1, X)
+    registry = score.ModelRegistry(str(model_root), MODEL_NAME, watch_root=str(watch_root))
+    registry.refresh()
+    assert registry.serving[0] == "1"
+    assert not registry.refresh()
+
+    publish_version(watch_root, 2, X, seed=1)
+    assert registry.refresh()
+    version, model = registry.serving
+    assert version == "2"
+    assert model.score_batch(X[FEATURE_NAMES]).shape == (len(X),)
+
+    # A broken artifact keeps the current version serving
+    broken_dir = watch_root / MODEL_NAME / "3"
+    broken_dir.mkdir()
+    (broken_dir / "model.joblib").write_bytes(b"truncated")
+    with pytest.raises(Exception):
+        registry.refresh()
+    assert registry.serving[0] == "2"
+
+def test_watcher_needs_watch_root(tmp_path, X, capsys):
+    publish_version(tmp_path, 1, X)
+    registry = score.ModelRegistry(str(tmp_path), MODEL_NAME)
+    registry.start_watcher(0.01)
+    assert registry._watcher is None
+    assert "hot-swap disabled" in capsys.readouterr().out
+
+def test_shadow_scorer_samples_and_compares(tmp_path, X, capsys):
+    publish_version(tmp_path, 1, X)
+    publish_version(tmp_path, 2, X, seed=1)
+    registry = score.ModelRegistry(str(tmp_path), MODEL_NAME, serving_version="1")
+    registry.refresh()
+    serving_scores = registry.serving[1].score_batch(X[FEATURE_NAMES])
+
+    never = score.ShadowScorer(registry, "2", sample_rate=0.0)
+    assert not never.maybe_submit(X[FEATURE_NAMES], "1", serving_scores)
+    always = score.ShadowScorer(registry, "2", sample_rate=1.0)
+    assert always.maybe_submit(X[FEATURE_NAMES], "1", serving_scores)
+    always._executor.shutdown(wait=True)
+
+    assert "2" in registry.pinned_versions
+    shadow_lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith("Shadow scoring: ")]
+    assert len(shadow_lines) == 1
+    assert '"shadow_version": "2"' in shadow_lines[0]
+    assert f'"n_rows": {len(X)}' in shadow_lines[0]
+
+def test_router_skips_segment_models_that_cannot_score(tmp_path, X):
+    # A Half-Space Trees model saved before its first full window raises on score_batch
+    HalfSpaceTreesDetector(window_size=100).fit(X[FEATURE_NAMES]).serialize(str(tmp_path / "ready.joblib"))
+    not_ready = HalfSpaceTreesDetector(window_size=1000).fit(X[FEATURE_NAMES])
+    assert not not_ready.ready
+    not_ready.serialize(str(tmp_path / "not_ready.joblib"))
+    manifest = {"features": FEATURE_NAMES, "segment_columns": ["merchant_id"], "segments": {"merchant_id": {
+        "1": {"path": "ready.joblib", "n_rows": len(X)}, "2": {"path": "not_ready.joblib", "n_rows": len(X)}}}}
+    (tmp_path / score.SEGMENT_MANIFEST_FILENAME).write_text(json.dumps(manifest))
+
+    router = score.SegmentModelRouter(str(tmp_path))
+    global_model = IsolationForestDetector(n_estimators=10).fit(X[FEATURE_NAMES])
+    df_input = X.head(3).assign(merchant_id=["1", "2", "3"])
+    anomaly_scores, scored_by, _ = router.score(df_input, global_model)
+    assert scored_by == ["merchant_id=1", "global", "global"]
+    np.testing.assert_allclose(anomaly_scores[1:], global_model.score_batch(df_input[FEATURE_NAMES].iloc[1:]))